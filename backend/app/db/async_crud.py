@@ -0,0 +1,48 @@
+"""
+crud.py の非同期版（AsyncSession用）
+
+対象はイベントループ上で動かす読み取りの多いエンドポイントだけ:
+- GET /api/projects/{project_id}/conversations（get_project, get_conversations_ordered_by_timestamp）
+- GET /api/issues/（get_issues）
+それ以外のエンドポイント・Alembic・スクリプトは同期版の crud.py を使う。
+
+関数名・引数・戻り値は crud.py と同じにしてあるため、エンドポイントを非同期にする場合は
+crud.py の関数をここに移して `await async_crud.xxx(db, ...)` に置き換える。
+（同じクエリを2か所で管理することになるため、非同期のエンドポイントで使わない関数は追加しない）
+"""
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+from app.db.pagination import Keyset, apply_keyset
+
+# プロジェクト関連CRUD
+async def get_project(db: AsyncSession, project_id: int):
+    return await db.scalar(select(models.Project).where(models.Project.id == project_id))
+
+# 会話関連CRUD
+async def get_conversations_ordered_by_timestamp(db: AsyncSession, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: Optional[int] = 100, after: Optional[Keyset] = None, descending: bool = False):
+    # プライバシー保護: user_idが指定されていない場合は空の結果を返す
+    if user_id is None:
+        return []
+    query = select(models.Conversation)
+    if project_id:
+        query = query.where(models.Conversation.project_id == project_id)
+    query = query.where(models.Conversation.user_id == user_id)
+    # タイムスタンプ（created_at）の昇順（descending=Trueなら降順）でソート。limit=Noneの場合は全件
+    query = apply_keyset(query, models.Conversation, after, descending=descending)
+    return (await db.scalars(query.offset(skip).limit(limit))).all()
+
+# 論点関連CRUD
+async def get_issues(db: AsyncSession, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: Optional[int] = 100, after: Optional[Keyset] = None):
+    # プライバシー保護: user_idが指定されていない場合は空の結果を返す
+    if user_id is None:
+        return []
+    query = select(models.Issue)
+    if project_id:
+        query = query.where(models.Issue.project_id == project_id)
+    query = query.where(models.Issue.user_id == user_id)
+    query = apply_keyset(query, models.Issue, after)
+    return (await db.scalars(query.offset(skip).limit(limit))).all()
@@ -0,0 +1,91 @@
+import os
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.session import get_pool_options
+
+# 非同期エンドポイント用のDB接続（asyncpgドライバ）
+# 同期版（app/db/session.py）はAlembic・スクリプト・同期エンドポイント用にそのまま残す
+
+# 非同期エンジンのコネクションプールの設定（同期版とは別枠）
+# 同期版の DB_POOL_SIZE / DB_MAX_OVERFLOW と合計した数が1プロセスの最大接続数になるため、
+# 非同期のエンドポイント（会話・論点の一覧）の分だけ小さく取る
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "2"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "3"))
+
+
+def get_async_pool_options() -> dict:
+    return {**get_pool_options(), "pool_size": ASYNC_DB_POOL_SIZE, "max_overflow": ASYNC_DB_MAX_OVERFLOW}
+
+
+# Cloud SQL Connectorの非同期版（APIサーバーのイベントループで1つだけ作成して使い回す）
+_async_connector = None
+_async_connector_lock = asyncio.Lock()
+
+
+async def _get_async_connector():
+    global _async_connector
+    async with _async_connector_lock:
+        if _async_connector is None:
+            from google.cloud.sql.connector import create_async_connector
+            _async_connector = await create_async_connector()
+        return _async_connector
+
+
+async def close_async_connector() -> None:
+    """非同期版のCloud SQL Connectorを閉じる（シャットダウン時に呼び出す）"""
+    global _async_connector
+    if _async_connector is not None:
+        await _async_connector.close_async()
+        _async_connector = None
+
+
+def get_async_engine():
+    DB_HOST = os.getenv("DB_HOST", "localhost")
+    DB_USER = os.getenv("DB_USER", "postgres")
+    DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+    DB_NAME = os.getenv("DB_NAME", "houseai")
+    INSTANCE_CONNECTION_NAME = os.getenv("INSTANCE_CONNECTION_NAME", None)
+
+    # Cloud SQL Auth Proxy経由（Cloud Run環境）
+    if DB_HOST.startswith("/cloudsql/") or INSTANCE_CONNECTION_NAME:
+        async def getconn():
+            connector = await _get_async_connector()
+            return await connector.connect_async(
+                INSTANCE_CONNECTION_NAME or DB_HOST.replace("/cloudsql/", ""),
+                "asyncpg",
+                user=DB_USER,
+                password=DB_PASSWORD,
+                db=DB_NAME
+            )
+        logging.info("非同期DBエンジン: Cloud SQL Connector経由で接続します")
+        return create_async_engine(
+            "postgresql+asyncpg://",
+            async_creator=getconn,
+            **get_async_pool_options()
+        )
+
+    # ローカルや通常のTCP接続
+    DB_PORT = os.getenv("DB_PORT", "5433")
+    database_url = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    logging.info(f"非同期DBエンジン: ローカル/TCPで接続します: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+    return create_async_engine(database_url, **get_async_pool_options())
+
+
+async_engine = get_async_engine()
+# コミット後に属性を再読み込みしない（非同期セッションでは暗黙の再読み込みができないため）
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """async def のエンドポイント用のDBセッション（get_db の非同期版）"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def close_async_engine() -> None:
+    await async_engine.dispose()
+    await close_async_connector()
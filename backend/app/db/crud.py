@@ -1,7 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from app.db import models, schemas
-from typing import List, Optional
-from sqlalchemy import or_
+from typing import Dict, List, Optional
+from datetime import datetime
+from sqlalchemy import delete, func, insert, literal, or_, select, union_all, update
+from app.db.pagination import Keyset, apply_keyset
+from app.services.project_context import invalidate_project_context
 
 # ユーザー関連CRUD
 def get_user(db: Session, user_id: int):
@@ -13,8 +16,9 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_firebase_uid(db: Session, firebase_uid: str):
     return db.query(models.User).filter(models.User.firebase_uid == firebase_uid).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, after: Optional[Keyset] = None):
+    query = apply_keyset(db.query(models.User), models.User, after)
+    return query.offset(skip).limit(limit).all()
 
 def create_user(db: Session, user: schemas.UserCreate):
     user_data = user.dict()
@@ -27,16 +31,85 @@ def create_user(db: Session, user: schemas.UserCreate):
     return db_user
 
 # プロジェクト関連CRUD
-def get_project(db: Session, project_id: int):
-    return db.query(models.Project).filter(models.Project.id == project_id).first()
-
-def get_projects(db: Session, user_id: Optional[int] = None, skip: int = 0, limit: int = 100):
+def get_project(db: Session, project_id: int, with_members: bool = False):
     query = db.query(models.Project)
+    if with_members:
+        query = query.options(selectinload(models.Project.members))
+    return query.filter(models.Project.id == project_id).first()
+
+# プロジェクト詳細に含める関連データ
+PROJECT_SECTION_MODELS = {
+    "conversations": models.Conversation,
+    "proposals": models.Proposal,
+    "issues": models.Issue,
+    "members": models.ProjectMember,
+}
+
+def count_project_sections(db: Session, project_id: int, sections: List[str]) -> Dict[str, int]:
+    """プロジェクトに紐づく会話・提案・論点・メンバーの件数を1回のクエリでまとめて取得"""
+    if not sections:
+        return {}
+    columns = [
+        select(func.count(PROJECT_SECTION_MODELS[section].id))
+        .where(PROJECT_SECTION_MODELS[section].project_id == project_id)
+        .scalar_subquery()
+        .label(section)
+        for section in sections
+    ]
+    return dict(db.execute(select(*columns)).one()._mapping)
+
+def count_by_project(db: Session, section: str, project_ids: List[int], user_id: Optional[int] = None) -> Dict[int, int]:
+    """複数プロジェクトの会話・提案・論点・メンバーの件数を1回の GROUP BY クエリで取得"""
+    if not project_ids:
+        return {}
+    model = PROJECT_SECTION_MODELS[section]
+    query = db.query(model.project_id, func.count(model.id)).filter(model.project_id.in_(project_ids))
+    if user_id is not None:
+        query = query.filter(model.user_id == user_id)
+    return dict(query.group_by(model.project_id).all())
+
+def get_latest_agreements_with_signature_counts(db: Session, project_ids: List[int]):
+    """複数プロジェクトの最新の協議書と署名数を1回のクエリで取得（プロジェクトIDをキーにした辞書）"""
+    if not project_ids:
+        return {}
+    signature_count = (
+        select(func.count(models.Signature.id))
+        .where(models.Signature.agreement_id == models.Agreement.id)
+        .scalar_subquery()
+    )
+    rows = db.query(
+        models.Agreement.id,
+        models.Agreement.project_id,
+        models.Agreement.status,
+        models.Agreement.is_signed,
+        signature_count.label("signature_count")
+    ).filter(
+        models.Agreement.project_id.in_(project_ids)
+    ).distinct(
+        models.Agreement.project_id
+    ).order_by(
+        models.Agreement.project_id, models.Agreement.id.desc()
+    ).all()
+    return {row.project_id: row for row in rows}
+
+def get_recent_project_rows(db: Session, section: str, project_id: int, limit: int):
+    """プロジェクトに紐づく会話・提案・論点を新しい順に最大limit件取得"""
+    model = PROJECT_SECTION_MODELS[section]
+    return db.query(model).filter(model.project_id == project_id).order_by(
+        model.created_at.desc(), model.id.desc()
+    ).limit(limit).all()
+
+def get_projects(db: Session, user_id: Optional[int] = None, skip: int = 0, limit: int = 100, with_members: bool = False, after: Optional[Keyset] = None):
+    query = db.query(models.Project)
+    if with_members:
+        # メンバーは一覧の全プロジェクト分を1回のINクエリでまとめて取得する
+        query = query.options(selectinload(models.Project.members))
     if user_id:
         query = query.filter(models.Project.user_id == user_id)
+    query = apply_keyset(query, models.Project, after)
     return query.offset(skip).limit(limit).all()
 
-def get_projects_for_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+def get_projects_for_user(db: Session, user_id: int, skip: int = 0, limit: int = 100, with_members: bool = False, after: Optional[Keyset] = None):
     """ユーザーが作成したプロジェクト＋参加しているプロジェクトを取得"""
     subquery = db.query(models.ProjectMember.project_id).filter(models.ProjectMember.user_id == user_id).subquery()
     query = db.query(models.Project).filter(
@@ -45,7 +118,9 @@ def get_projects_for_user(db: Session, user_id: int, skip: int = 0, limit: int =
             models.Project.id.in_(subquery)     # 参加しているプロジェクト
         )
     )
-
+    if with_members:
+        query = query.options(selectinload(models.Project.members))
+    query = apply_keyset(query, models.Project, after)
     return query.offset(skip).limit(limit).all()
 
 def create_project(db: Session, project: schemas.ProjectCreate):
@@ -71,6 +146,7 @@ def delete_project(db: Session, project_id: int):
     if db_project:
         db.delete(db_project)
         db.commit()
+        invalidate_project_context(project_id)
         return True
     return False
 
@@ -89,7 +165,7 @@ def get_conversations(db: Session, project_id: Optional[int] = None, user_id: Op
     query = query.filter(models.Conversation.user_id == user_id)
     return query.offset(skip).limit(limit).all()
 
-def get_conversations_ordered_by_timestamp(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: int = 100):
+def get_conversations_ordered_by_timestamp(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: Optional[int] = 100, after: Optional[Keyset] = None, descending: bool = False):
     # プライバシー保護: user_idが指定されていない場合は空の結果を返す
     if user_id is None:
         return []
@@ -98,8 +174,28 @@ def get_conversations_ordered_by_timestamp(db: Session, project_id: Optional[int
     if project_id:
         query = query.filter(models.Conversation.project_id == project_id)
     query = query.filter(models.Conversation.user_id == user_id)
-    # タイムスタンプ（created_at）の昇順でソート
-    return query.order_by(models.Conversation.created_at).offset(skip).limit(limit).all()
+    # タイムスタンプ（created_at）の昇順（descending=Trueなら降順）でソート。limit=Noneの場合は全件
+    query = apply_keyset(query, models.Conversation, after, descending=descending)
+    return query.offset(skip).limit(limit).all()
+
+def get_conversations_after(db: Session, project_id: int, user_id: Optional[int], after_id: int, since: Optional[datetime] = None):
+    """
+    指定した会話IDより後の会話（sinceを指定した場合はその日時以降の会話も）をID順に取得（論点の差分抽出用）
+
+    IDは挿入時に採番されるため、小さいIDの会話が後からコミットされることがある。
+    since で重ねて取得し、処理済みかどうかは呼び出し側でIDを見て判断する。
+    """
+    # プライバシー保護: user_idが指定されていない場合は空の結果を返す
+    if user_id is None:
+        return []
+    condition = models.Conversation.id > after_id
+    if since is not None:
+        condition = or_(condition, models.Conversation.created_at >= since)
+    return db.query(models.Conversation).filter(
+        models.Conversation.project_id == project_id,
+        models.Conversation.user_id == user_id,
+        condition
+    ).order_by(models.Conversation.id).all()
 
 def create_conversation(db: Session, conversation: schemas.ConversationCreate):
     db_conversation = models.Conversation(**conversation.dict())
@@ -135,7 +231,7 @@ def update_analysis(db: Session, analysis_id: int, analysis_data: schemas.Analys
 def get_proposal(db: Session, proposal_id: int):
     return db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
 
-def get_proposals(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: int = 100):
+def get_proposals(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: int = 100, after: Optional[Keyset] = None):
     # プライバシー保護: user_idが指定されていない場合は空の結果を返す
     if user_id is None:
         return []
@@ -144,6 +240,7 @@ def get_proposals(db: Session, project_id: Optional[int] = None, user_id: Option
     if project_id:
         query = query.filter(models.Proposal.project_id == project_id)
     query = query.filter(models.Proposal.user_id == user_id)
+    query = apply_keyset(query, models.Proposal, after)
     return query.offset(skip).limit(limit).all()
 
 def create_proposal(db: Session, proposal: schemas.ProposalCreate):
@@ -153,6 +250,34 @@ def create_proposal(db: Session, proposal: schemas.ProposalCreate):
     db.refresh(db_proposal)
     return db_proposal
 
+def create_proposals_with_points(db: Session, proposals: List[schemas.ProposalCreate], points: List[List[Dict[str, str]]]) -> List[models.Proposal]:
+    """
+    複数の提案とそのポイントを1つのトランザクションでまとめて保存する
+
+    points[i] は proposals[i] のポイント（type, content）のリスト。
+    提案は複数行INSERT ... RETURNING で一度に作成し、返されたIDでポイントもまとめて作成する。
+    途中で失敗した場合はすべてロールバックする。
+    """
+    if not proposals:
+        return []
+    try:
+        db_proposals = db.scalars(
+            insert(models.Proposal).returning(models.Proposal, sort_by_parameter_order=True),
+            [proposal.dict() for proposal in proposals]
+        ).all()
+        point_rows = [
+            {"proposal_id": db_proposal.id, "type": point["type"], "content": point["content"]}
+            for db_proposal, proposal_points in zip(db_proposals, points)
+            for point in proposal_points
+        ]
+        if point_rows:
+            db.execute(insert(models.ProposalPoint), point_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return db_proposals
+
 def update_proposal(db: Session, proposal_id: int, proposal_data: dict):
     db_proposal = get_proposal(db, proposal_id)
     if db_proposal:
@@ -174,7 +299,7 @@ def delete_proposal(db: Session, proposal_id: int):
 def get_issue(db: Session, issue_id: int):
     return db.query(models.Issue).filter(models.Issue.id == issue_id).first()
 
-def get_issues(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: int = 100):
+def get_issues(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: Optional[int] = 100, after: Optional[Keyset] = None):
     # プライバシー保護: user_idが指定されていない場合は空の結果を返す
     if user_id is None:
         return []
@@ -183,6 +308,7 @@ def get_issues(db: Session, project_id: Optional[int] = None, user_id: Optional[
     if project_id:
         query = query.filter(models.Issue.project_id == project_id)
     query = query.filter(models.Issue.user_id == user_id)
+    query = apply_keyset(query, models.Issue, after)
     return query.offset(skip).limit(limit).all()
 
 def create_issue(db: Session, issue: schemas.IssueCreate):
@@ -200,25 +326,47 @@ def create_issue(db: Session, issue: schemas.IssueCreate):
     db.refresh(db_issue)
     return db_issue
 
+# 作成した論点を返すときの列（全文検索用の列は返さない）
+ISSUE_RETURNING_COLUMNS = [column for column in models.Issue.__table__.c if column.key != "search_vector"]
+
+def _insert_issues(db: Session, issues: List[schemas.IssueCreate]) -> list:
+    """論点を複数行INSERT ... RETURNING で作成し、作成した行を入力と同じ順で返す（コミットはしない）"""
+    if not issues:
+        return []
+    # ORMオブジェクトではなく行として返すため、コミット後に再読み込みのSELECTが発生しない
+    return db.execute(
+        insert(models.Issue.__table__).returning(*ISSUE_RETURNING_COLUMNS, sort_by_parameter_order=True),
+        [issue.dict() for issue in issues]
+    ).all()
+
 def create_issues_batch(db: Session, issues: List[schemas.IssueCreate]):
-    """複数の論点を一括で作成"""
-    db_issues = []
-    for issue in issues:
-        db_issue = models.Issue(
-            project_id=issue.project_id,
-            user_id=issue.user_id,
-            topic=getattr(issue, 'topic', None),
-            content=issue.content,
-            type=issue.type,
-            agreement_level=issue.agreement_level,
-            classification=issue.classification
-        )
-        db.add(db_issue)
-        db_issues.append(db_issue)
-    db.commit()
-    for issue in db_issues:
-        db.refresh(issue)
-    return db_issues
+    """複数の論点を一括で作成（1回のINSERTとコミット）"""
+    try:
+        rows = _insert_issues(db, issues)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return rows
+
+def replace_project_issues(db: Session, project_id: int, user_id: Optional[int], issues: List[schemas.IssueCreate]):
+    """
+    プロジェクト（オプションでユーザー単位）の論点を、指定した論点で置き換える
+
+    削除と作成を1つのトランザクションで行うため、他のリクエストから論点が空に見える瞬間がない。
+    作成した行を入力と同じ順で返す。途中で失敗した場合は元の論点が残る。
+    """
+    stmt = delete(models.Issue).where(models.Issue.project_id == project_id)
+    if user_id is not None:
+        stmt = stmt.where(models.Issue.user_id == user_id)
+    try:
+        db.execute(stmt.execution_options(synchronize_session=False))
+        rows = _insert_issues(db, issues)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return rows
 
 def update_issue(db: Session, issue_id: int, issue_data: schemas.IssueBase):
     db_issue = get_issue(db, issue_id)
@@ -229,6 +377,59 @@ def update_issue(db: Session, issue_id: int, issue_data: schemas.IssueBase):
         db.refresh(db_issue)
     return db_issue
 
+def count_issues_by_category(db: Session, project_ids: Optional[List[int]] = None, user_id: Optional[int] = None):
+    """
+    論点数を (プロジェクトID, 分類, タイプ, 合意度) の組み合わせごとに集計する
+
+    論点の行は読み込まず、1回の GROUP BY クエリで件数だけを取得する。
+    """
+    # プライバシー保護: user_idが指定されていない場合は空の結果を返す
+    if user_id is None:
+        return []
+    query = db.query(
+        models.Issue.project_id,
+        models.Issue.classification,
+        models.Issue.type,
+        models.Issue.agreement_level,
+        func.count(models.Issue.id).label("count")
+    )
+    if project_ids is not None:
+        query = query.filter(models.Issue.project_id.in_(project_ids))
+    query = query.filter(models.Issue.user_id == user_id)
+    return query.group_by(
+        models.Issue.project_id,
+        models.Issue.classification,
+        models.Issue.type,
+        models.Issue.agreement_level
+    ).all()
+
+def _build_issue_summary(project_id: Optional[int], rows) -> schemas.IssueSummary:
+    summary = schemas.IssueSummary(
+        project_id=project_id,
+        by_type={issue_type.value: 0 for issue_type in schemas.IssueType},
+        by_agreement_level={level.value: 0 for level in schemas.AgreementLevel},
+    )
+    for row in rows:
+        summary.total += row.count
+        if row.classification is not None:
+            setattr(summary, row.classification.value, getattr(summary, row.classification.value) + row.count)
+        summary.by_type[row.type.value] += row.count
+        if row.agreement_level is not None:
+            summary.by_agreement_level[row.agreement_level.value] += row.count
+    return summary
+
+def get_issue_summary(db: Session, project_id: Optional[int] = None, user_id: Optional[int] = None) -> schemas.IssueSummary:
+    """分類・タイプ・合意度ごとの論点数（project_id省略時はユーザーの全プロジェクトの合計。user_id未指定の場合はすべて0）"""
+    rows = count_issues_by_category(db, project_ids=[project_id] if project_id is not None else None, user_id=user_id)
+    return _build_issue_summary(project_id, rows)
+
+def get_issue_summaries(db: Session, project_ids: List[int], user_id: Optional[int] = None) -> List[schemas.IssueSummary]:
+    """複数プロジェクトの論点サマリーを1回の集計クエリでまとめて取得（project_idsの順に返す）"""
+    rows_by_project: Dict[int, list] = {project_id: [] for project_id in project_ids}
+    for row in count_issues_by_category(db, project_ids=project_ids, user_id=user_id):
+        rows_by_project[row.project_id].append(row)
+    return [_build_issue_summary(project_id, rows) for project_id, rows in rows_by_project.items()]
+
 def delete_project_issues(db: Session, project_id: int, user_id: Optional[int] = None):
     """プロジェクトに関連するすべての論点を削除（オプションでユーザー単位）"""
     # プロジェクトの論点を対象に削除クエリを作成
@@ -241,6 +442,35 @@ def delete_project_issues(db: Session, project_id: int, user_id: Optional[int] =
     db.commit()
     return True
 
+def delete_issues(db: Session, issue_ids: List[int]) -> int:
+    """指定したIDの論点をまとめて削除"""
+    if not issue_ids:
+        return 0
+    deleted = db.query(models.Issue).filter(models.Issue.id.in_(issue_ids)).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+# 論点抽出の集計状態CRUD
+def get_issue_extraction_state(db: Session, project_id: int, user_id: Optional[int] = None):
+    query = db.query(models.IssueExtractionState).filter(models.IssueExtractionState.project_id == project_id)
+    if user_id is None:
+        query = query.filter(models.IssueExtractionState.user_id.is_(None))
+    else:
+        query = query.filter(models.IssueExtractionState.user_id == user_id)
+    return query.first()
+
+def save_issue_extraction_state(db: Session, project_id: int, user_id: Optional[int], last_conversation_id: int, state: str):
+    """論点抽出の集計状態を作成または更新する"""
+    db_state = get_issue_extraction_state(db, project_id, user_id)
+    if db_state is None:
+        db_state = models.IssueExtractionState(project_id=project_id, user_id=user_id)
+        db.add(db_state)
+    db_state.last_conversation_id = last_conversation_id
+    db_state.state = state
+    db.commit()
+    db.refresh(db_state)
+    return db_state
+
 # 提案ポイント（ProposalPoint）関連CRUD
 def get_proposal_points(db: Session, proposal_id: int) -> list:
     return db.query(models.ProposalPoint).filter(models.ProposalPoint.proposal_id == proposal_id).all()
@@ -341,6 +571,8 @@ def create_project_member(db: Session, member: schemas.ProjectMemberCreate):
     db.add(db_member)
     db.commit()
     db.refresh(db_member)
+    # プロンプト用のプロジェクト情報キャッシュを破棄
+    invalidate_project_context(db_member.project_id)
     return db_member
 
 def get_estates(db: Session, project_id: Optional[int] = None):
@@ -354,4 +586,183 @@ def create_estate(db: Session, estate: schemas.EstateCreate):
     db.add(db_estate)
     db.commit()
     db.refresh(db_estate)
+    # プロンプト用のプロジェクト情報キャッシュを破棄
+    invalidate_project_context(db_estate.project_id)
     return db_estate 
+
+# AI相談員チャットの会話要約CRUD
+def get_chat_history_summary(db: Session, project_id: int, user_id: Optional[int] = None):
+    query = db.query(models.ChatHistorySummary).filter(models.ChatHistorySummary.project_id == project_id)
+    if user_id is None:
+        query = query.filter(models.ChatHistorySummary.user_id.is_(None))
+    else:
+        query = query.filter(models.ChatHistorySummary.user_id == user_id)
+    return query.first()
+
+def save_chat_history_summary(db: Session, project_id: int, user_id: Optional[int], summary: str, summarized_count: int):
+    """会話要約を作成または更新する"""
+    db_summary = get_chat_history_summary(db, project_id, user_id)
+    if db_summary is None:
+        db_summary = models.ChatHistorySummary(project_id=project_id, user_id=user_id)
+        db.add(db_summary)
+    db_summary.summary = summary
+    db_summary.summarized_count = summarized_count
+    db.commit()
+    db.refresh(db_summary)
+    return db_summary
+
+def get_conversations_for_sentiment(db: Session, project_id: int, user_id: Optional[int] = None, only_missing: bool = True):
+    """感情分析の対象となる会話（AI相談員の発言を除く）のIDと本文を取得"""
+    query = db.query(models.Conversation.id, models.Conversation.content).filter(
+        models.Conversation.project_id == project_id,
+        or_(models.Conversation.speaker.is_(None), models.Conversation.speaker != "AI相談員")
+    )
+    if user_id is not None:
+        query = query.filter(models.Conversation.user_id == user_id)
+    if only_missing:
+        query = query.filter(models.Conversation.sentiment.is_(None))
+    return query.order_by(models.Conversation.created_at).all()
+
+def bulk_update_conversation_sentiments(db: Session, sentiments: Dict[int, str]) -> int:
+    """会話IDと感情ラベルの対応を一括で更新する"""
+    if not sentiments:
+        return 0
+    db.execute(
+        update(models.Conversation),
+        [{"id": conversation_id, "sentiment": sentiment} for conversation_id, sentiment in sentiments.items()]
+    )
+    db.commit()
+    return len(sentiments)
+
+# 全文検索
+SEARCHABLE_SECTIONS = {
+    "conversations": models.Conversation,
+    "issues": models.Issue,
+    "proposals": models.Proposal,
+}
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_project_texts(db: Session, project_id: int, user_id: int, terms: List[str], sections: List[str], limit: int = 20):
+    """
+    プロジェクトの会話・論点・提案の本文を全文検索し、関連度の高い順に返す
+
+    n-gramの tsvector（GINインデックス）で候補を絞り込み、各語を本文に含むかを ILIKE で確認する
+    （2-gramがばらばらに現れるだけの行を除くため）。行は (section, id, content, created_at, rank)。
+    """
+    tsquery = func.public.ja_ngram_tsquery(" ".join(terms))
+    statements = []
+    for section in sections:
+        model = SEARCHABLE_SECTIONS[section]
+        statements.append(
+            select(
+                literal(section).label("section"),
+                model.id,
+                model.content,
+                model.created_at,
+                func.ts_rank(model.search_vector, tsquery).label("rank")
+            ).where(
+                model.project_id == project_id,
+                model.user_id == user_id,
+                model.search_vector.bool_op("@@")(tsquery),
+                *[model.content.ilike(f"%{_escape_like(term)}%", escape="\\") for term in terms]
+            )
+        )
+    if not statements:
+        return []
+    hits = (union_all(*statements) if len(statements) > 1 else statements[0]).subquery()
+    return db.execute(
+        select(hits).order_by(hits.c.rank.desc(), hits.c.created_at.desc()).limit(limit)
+    ).all()
+
+# 非同期ジョブCRUD
+def create_job(db: Session, job_type: str, payload: str, project_id: Optional[int] = None, user_id: Optional[int] = None):
+    db_job = models.Job(job_type=job_type, payload=payload, project_id=project_id, user_id=user_id, status="queued")
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def get_job(db: Session, job_id: int):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def get_active_job(db: Session, job_type: str, payload: str):
+    """同じ種別・同じ入力で待機中または実行中のジョブを取得"""
+    return db.query(models.Job).filter(
+        models.Job.job_type == job_type,
+        models.Job.payload == payload,
+        models.Job.status.in_(["queued", "running"])
+    ).order_by(models.Job.id).first()
+
+def claim_next_job(db: Session, job_types: Optional[List[str]] = None):
+    """
+    待機中のジョブを古い順に1件取り出して実行中にする
+
+    FOR UPDATE SKIP LOCKED で行ロックを取るため、複数のワーカー（別プロセスを含む）が
+    同時に呼び出しても同じジョブを重複して取り出さない。
+    """
+    query = db.query(models.Job).filter(models.Job.status == "queued")
+    if job_types is not None:
+        query = query.filter(models.Job.job_type.in_(job_types))
+    db_job = query.order_by(models.Job.id).with_for_update(skip_locked=True).first()
+    if db_job is None:
+        db.rollback()
+        return None
+    db_job.status = "running"
+    db_job.started_at = func.now()
+    db_job.heartbeat_at = func.now()
+    db_job.attempts = (db_job.attempts or 0) + 1
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def _running_job_attempt(db: Session, job_id: int, attempt: int):
+    """取り出した時点の試行（attempts）のまま実行中のジョブ（再投入されていれば一致しない）"""
+    return db.query(models.Job).filter(
+        models.Job.id == job_id,
+        models.Job.status == "running",
+        models.Job.attempts == attempt
+    )
+
+def heartbeat_job(db: Session, job_id: int, attempt: int) -> bool:
+    """実行中のジョブの heartbeat_at を更新する（再投入されて別の試行になっていればFalse）"""
+    updated = _running_job_attempt(db, job_id, attempt).update(
+        {models.Job.heartbeat_at: func.now()}, synchronize_session=False
+    )
+    db.commit()
+    return updated == 1
+
+def finish_job(db: Session, job_id: int, attempt: int, result: Optional[str] = None, error: Optional[str] = None) -> bool:
+    """
+    ジョブを完了（errorを指定した場合は失敗）にする
+
+    再投入されて別の試行になったジョブの結果は上書きしない（その場合はFalse）。
+    """
+    updated = _running_job_attempt(db, job_id, attempt).update({
+        models.Job.status: "failed" if error is not None else "succeeded",
+        models.Job.result: result,
+        models.Job.error: error,
+        models.Job.finished_at: func.now(),
+    }, synchronize_session=False)
+    db.commit()
+    return updated == 1
+
+def requeue_stale_jobs(db: Session, stale_before: datetime, max_attempts: int) -> int:
+    """
+    ワーカーの停止などでハートビートが途絶えた実行中のジョブを待機中に戻す
+    （試行回数が上限に達したジョブは失敗にする）
+    """
+    stale = db.query(models.Job).filter(
+        models.Job.status == "running",
+        func.coalesce(models.Job.heartbeat_at, models.Job.started_at) < stale_before
+    ).with_for_update(skip_locked=True).all()
+    for db_job in stale:
+        if db_job.attempts >= max_attempts:
+            db_job.status = "failed"
+            db_job.error = "ジョブの実行中にワーカーが停止しました"
+            db_job.finished_at = func.now()
+        else:
+            db_job.status = "queued"
+    db.commit()
+    return len(stale)
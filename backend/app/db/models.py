@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum, Float, Index, UniqueConstraint, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import enum
 from .session import Base
+from . import search_ddl
+
+# 全文検索用の関数は create_all でテーブルを作る場合（reset_db.py）も先に作成する（定義は search_ddl.py にまとめている）
+for _statement in search_ddl.NGRAM_SEARCH_FUNCTIONS:
+    event.listen(Base.metadata, "before_create", DDL(_statement))
 
 # 論点タイプの列挙型
 class IssueType(str, enum.Enum):
@@ -33,7 +39,7 @@ class User(Base):
     hashed_password = Column(String, nullable=True)
     name = Column(String)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # カーソルページングの並び順のキー
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # リレーションシップ
@@ -46,9 +52,9 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(Text)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     status = Column(String, default="active")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # カーソルページングの並び順のキー
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # リレーションシップ
@@ -57,18 +63,27 @@ class Project(Base):
     proposals = relationship("Proposal", back_populates="project")
     issues = relationship("Issue", back_populates="project", cascade="all, delete-orphan")
     estates = relationship("Estate", back_populates="project")
+    # 一覧表示用（メンバーの追加・削除は crud 経由で行うため読み取り専用）
+    members = relationship("ProjectMember", viewonly=True, order_by="ProjectMember.id")
 
 # 会話モデル
 class Conversation(Base):
     __tablename__ = "conversations"
+    # 一覧取得（プロジェクト・ユーザーで絞り込み、作成日時順）用
+    __table_args__ = (
+        Index("ix_conversations_project_id_user_id_created_at", "project_id", "user_id", "created_at"),
+        Index("ix_conversations_search_vector", "search_vector", postgresql_using="gin"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # 発言者または対象ユーザー
     content = Column(Text, nullable=False)
+    # 全文検索用（contentの追加・更新時にトリガーで計算される。通常の読み込みでは取得しない）
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     speaker = Column(String, nullable=True)  # 話者情報（ユーザー or AI）
     sentiment = Column(String, nullable=True)  # 感情分析結果
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # カーソルページングの並び順のキー
     
     # リレーションシップ
     project = relationship("Project", back_populates="conversations")
@@ -91,16 +106,22 @@ class Analysis(Base):
 # 提案モデル
 class Proposal(Base):
     __tablename__ = "proposals"
+    __table_args__ = (
+        Index("ix_proposals_project_id_user_id", "project_id", "user_id"),
+        Index("ix_proposals_search_vector", "search_vector", postgresql_using="gin"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # 提案作成者
     title = Column(String)
     content = Column(Text)
+    # 全文検索用（contentの追加・更新時にトリガーで計算される。通常の読み込みでは取得しない）
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     support_rate = Column(Float, default=0.0)  # 支持率
     is_selected = Column(Boolean, default=False)  # 選択されたかどうか
     is_favorite = Column(Boolean, default=False)  # お気に入りかどうか
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # カーソルページングの並び順のキー
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # リレーションシップ
@@ -112,7 +133,7 @@ class Proposal(Base):
 class ProposalPoint(Base):
     __tablename__ = "proposal_points"
     id = Column(Integer, primary_key=True, index=True)
-    proposal_id = Column(Integer, ForeignKey("proposals.id", ondelete="CASCADE"), nullable=False)
+    proposal_id = Column(Integer, ForeignKey("proposals.id", ondelete="CASCADE"), nullable=False, index=True)
     type = Column(String, nullable=False)  # 'merit', 'demerit', 'cost', 'effort' など
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -124,16 +145,22 @@ class ProposalPoint(Base):
 # 論点（Issue）モデル
 class Issue(Base):
     __tablename__ = "issues"
+    __table_args__ = (
+        Index("ix_issues_project_id_user_id", "project_id", "user_id"),
+        Index("ix_issues_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # 論点作成者
     topic = Column(String, nullable=True)  # 論点の見出し
     content = Column(Text, nullable=False)
+    # 全文検索用（contentの追加・更新時にトリガーで計算される。通常の読み込みでは取得しない）
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     type = Column(Enum(IssueType), nullable=False)  # type: ignore
     agreement_level = Column(Enum(AgreementLevel), nullable=True)  # type: ignore
     classification = Column(Enum(IssueClassification), nullable=False, default=IssueClassification.discussing)  # type: ignore
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # カーソルページングの並び順のキー
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # リレーションシップ
@@ -147,7 +174,7 @@ class Agreement(Base):
     __tablename__ = "agreements"
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
     proposal_id = Column(Integer, ForeignKey("proposals.id", ondelete="SET NULL"), nullable=True)
     title = Column(String, nullable=True)
     content = Column(Text, nullable=False)
@@ -165,7 +192,7 @@ class Signature(Base):
     __tablename__ = "signatures"
 
     id = Column(Integer, primary_key=True, index=True)
-    agreement_id = Column(Integer, ForeignKey("agreements.id", ondelete="CASCADE"), nullable=False)
+    agreement_id = Column(Integer, ForeignKey("agreements.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     method = Column(String, nullable=False)  # 'pin' or 'text'
     value = Column(String, nullable=False)   # PINまたは氏名
@@ -179,8 +206,8 @@ class Signature(Base):
 class ProjectMember(Base):
     __tablename__ = "project_members"
     id = Column(Integer, primary_key=True)
-    project_id = Column(Integer, ForeignKey("projects.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     role = Column(String, default="member")  # 役割: owner/member など
     relation = Column(String)  # 続柄
     name = Column(String, nullable=True)  # 氏名
@@ -191,7 +218,7 @@ class Estate(Base):
     __tablename__ = "estates"
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
     name = Column(String, nullable=False)
     address = Column(String, nullable=False)
     property_tax_value = Column(Float, nullable=True)
@@ -219,3 +246,62 @@ class ProjectInvitation(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     project = relationship("Project")
+
+# LLM応答キャッシュ（プロセス間で共有する永続キャッシュ）
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache_entries"
+
+    cache_key = Column(String(64), primary_key=True)  # モデル名＋正規化プロンプトのSHA-256
+    model_name = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+# AI相談員チャットの会話要約（古い発言を要約して保持し、プロンプトの肥大化を防ぐ）
+class ChatHistorySummary(Base):
+    __tablename__ = "chat_history_summaries"
+    __table_args__ = (UniqueConstraint("project_id", "user_id", name="uq_chat_history_summaries_project_user"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_count = Column(Integer, nullable=False, default=0)  # 要約に含めた先頭からの発言数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+# 論点抽出の集計状態（新しい会話だけを追加で集計する差分抽出用）
+class IssueExtractionState(Base):
+    __tablename__ = "issue_extraction_states"
+    __table_args__ = (UniqueConstraint("project_id", "user_id", name="uq_issue_extraction_states_project_user"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    last_conversation_id = Column(Integer, nullable=False, default=0)  # 集計済みの最後の会話ID
+    state = Column(Text, nullable=False)  # JSON形式で保存（トピック・話者ごとの意見キーワードと論点のスナップショット）
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+# 非同期ジョブ（提案生成・論点抽出などの時間のかかるAI処理をワーカーで実行する）
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False, index=True)  # 例: issues.extract / proposals.generate / agreements.generate
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    payload = Column(Text, nullable=False)  # JSON形式で保存（ジョブの入力）
+    result = Column(Text, nullable=True)  # JSON形式で保存（ジョブの結果）
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # 実行中のワーカーが定期的に更新する
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+# search_vector を計算するトリガー（create_all でテーブルを作った場合も作成する）
+for _model in (Conversation, Proposal, Issue):
+    event.listen(_model.__table__, "after_create", DDL(search_ddl.search_vector_trigger(_model.__tablename__)))
@@ -0,0 +1,68 @@
+"""
+一覧取得のカーソル（キーセット）ページング
+
+(created_at, id) の組を並び順のキーとし、前のページの最後の行より後ろだけを取得する。
+OFFSET と違い、何ページ目でも取得コストは1ページ分で済み、途中で行が追加されても取りこぼさない。
+カーソルはクライアントから見て中身を意識しない文字列（base64）として返す。
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+# 次のページのカーソルを返すレスポンスヘッダー
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+Keyset = Tuple[datetime, int]
+
+
+def encode_cursor(row: Any) -> str:
+    """行の (created_at, id) からカーソル文字列を作る"""
+    data = json.dumps({"created_at": row.created_at.isoformat(), "id": row.id})
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], skip: int = 0) -> Optional[Keyset]:
+    """
+    カーソル文字列を (created_at, id) に戻す（不正な値の場合は ValueError）
+
+    cursor と skip（OFFSET）を同時に指定した場合も、2つのページングが組み合わさってしまうため ValueError にする。
+    """
+    if not cursor:
+        return None
+    if skip:
+        raise ValueError("cursor と skip は同時に指定できません")
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(data["created_at"]), int(data["id"])
+    except Exception:
+        raise ValueError("カーソルの形式が正しくありません")
+
+
+def apply_keyset(query: Any, model: Any, after: Optional[Keyset] = None, descending: bool = False) -> Any:
+    """
+    (created_at, id) 順に並べ、after の位置より後ろの行だけに絞り込む
+
+    Query（同期）と Select（非同期）のどちらにも使える。
+    """
+    key = tuple_(model.created_at, model.id)
+    if after is not None:
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    if descending:
+        return query.order_by(model.created_at.desc(), model.id.desc())
+    return query.order_by(model.created_at, model.id)
+
+
+def split_page(rows: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    limit + 1 件取得した結果を、1ページ分の行と次のページのカーソルに分ける
+
+    次のページがない場合のカーソルは None。
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1])
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Literal, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -54,6 +54,11 @@ class ProjectDetail(Project):
     proposals: List["Proposal"] = []
     issues: List["Issue"] = []
     members: List["ProjectMember"] = []
+    # 全件数（一覧に含める件数を制限しているため別に返す。取得していないセクションはNone）
+    conversation_count: Optional[int] = None
+    proposal_count: Optional[int] = None
+    issue_count: Optional[int] = None
+    member_count: Optional[int] = None
 
 # 会話スキーマ
 class ConversationBase(BaseSchema):
@@ -168,6 +173,16 @@ class Issue(IssueBase):
     class Config:
         from_attributes = True
 
+# 論点数のサマリー（分類ごとの件数に加え、タイプ・合意度ごとの内訳）
+class IssueSummary(BaseModel):
+    project_id: Optional[int] = None
+    total: int = 0
+    agreed: int = 0
+    discussing: int = 0
+    disagreed: int = 0
+    by_type: Dict[str, int] = {}
+    by_agreement_level: Dict[str, int] = {}
+
 # 提案ポイント（メリット・デメリット等）スキーマ
 class ProposalPointBase(BaseSchema):
     proposal_id: int
@@ -312,3 +327,61 @@ class AiChatResponse(BaseSchema):
     reply: str
     project_id: int | None = None
     user_id: int | None = None 
+
+# 非同期ジョブ用スキーマ
+class JobCreate(BaseSchema):
+    job_type: str
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    project_id: int | None = None
+    user_id: int | None = None
+
+# ジョブの種類ごとの入力（登録時に検証する）
+class IssuesExtractJobPayload(BaseSchema):
+    project_id: int
+    user_id: int | None = None
+    mode: Literal["full", "incremental"] = "full"
+
+class ProposalsGenerateJobPayload(BaseSchema):
+    project_id: str
+    issues: List[Dict[str, Any]]
+    estate_data: Optional[Dict[str, Any]] = None
+    user_preferences: Optional[Dict[str, Any]] = None
+    user_id: int | None = None
+
+class AgreementsGenerateJobPayload(BaseSchema):
+    project_id: int
+    proposal_id: int
+
+class JobStatus(BaseSchema):
+    id: int
+    job_type: str
+    status: str  # queued, running, succeeded, failed
+    project_id: int | None = None
+    user_id: int | None = None
+    attempts: int
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+# ダッシュボード用スキーマ
+class AgreementProgress(BaseSchema):
+    agreement_id: int
+    status: str | None = None
+    is_signed: bool = False
+    signature_count: int = 0
+    required_signatures: int = 0  # プロジェクトのメンバー数
+
+class ProjectDashboardItem(Project):
+    member_count: int = 0
+    issue_summary: IssueSummary
+    proposal_count: int = 0
+    agreement: AgreementProgress | None = None  # 協議書がない場合はNone
+
+# 全文検索の結果
+class SearchHit(BaseSchema):
+    section: str  # conversations, issues, proposals
+    id: int
+    snippet: str  # 一致した語を<mark>で囲んだ抜粋（HTMLエスケープ済み）
+    rank: float
+    created_at: datetime | None = None
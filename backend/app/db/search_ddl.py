@@ -0,0 +1,82 @@
+"""
+全文検索用のDDL（models.py の create_all とマイグレーション 3c9e71d5a2f8 の両方から使う唯一の定義）
+
+日本語は空白で単語が区切られないため、文字の1-gram・2-gramを語彙素とした tsvector / tsquery を作る。
+search_vector 列はトリガーで content から計算する（生成列にすると追加時にテーブル全体の書き換えとロックが発生するため）。
+pg_dump / pg_restore は search_path を空にして実行するため、関数の呼び出しはスキーマ名（public）付きで書く。
+"""
+
+# search_vector 列を持つテーブル
+SEARCH_TABLES = ["conversations", "issues", "proposals"]
+
+NGRAM_SEARCH_FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION public.ja_ngram_tokens(input text) RETURNS SETOF text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT token
+        FROM regexp_split_to_table(lower(coalesce(input, '')), '[[:space:][:punct:]　、。，．・「」『』（）【】！？]+') AS token
+        WHERE token <> ''
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.ja_ngram_tsvector(input text) RETURNS tsvector
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT array_to_tsvector(coalesce(array_agg(DISTINCT gram), '{}'))
+        FROM (
+            SELECT substr(token, i, 1) AS gram
+            FROM public.ja_ngram_tokens(input) AS token, generate_series(1, char_length(token)) AS i
+            UNION ALL
+            SELECT substr(token, i, 2)
+            FROM public.ja_ngram_tokens(input) AS token, generate_series(1, char_length(token) - 1) AS i
+        ) AS grams
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.ja_ngram_tsquery(input text) RETURNS tsquery
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT string_agg(quote_literal(gram), ' & ')::tsquery
+        FROM (
+            SELECT DISTINCT CASE WHEN char_length(token) = 1 THEN token ELSE substr(token, i, 2) END AS gram
+            FROM public.ja_ngram_tokens(input) AS token, generate_series(1, greatest(char_length(token) - 1, 1)) AS i
+        ) AS grams
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.ja_ngram_search_vector_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := public.ja_ngram_tsvector(NEW.content);
+        RETURN NEW;
+    END
+    $$
+    """,
+]
+
+DROP_NGRAM_SEARCH_FUNCTIONS = [
+    "DROP FUNCTION IF EXISTS public.ja_ngram_search_vector_update()",
+    "DROP FUNCTION IF EXISTS public.ja_ngram_tsquery(text)",
+    "DROP FUNCTION IF EXISTS public.ja_ngram_tsvector(text)",
+    "DROP FUNCTION IF EXISTS public.ja_ngram_tokens(text)",
+]
+
+
+def search_vector_trigger(table: str) -> str:
+    """content の追加・更新時に search_vector を計算するトリガー"""
+    return (
+        f"CREATE TRIGGER {table}_search_vector_update "
+        f"BEFORE INSERT OR UPDATE OF content ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION public.ja_ngram_search_vector_update()"
+    )
+
+
+def drop_search_vector_trigger(table: str) -> str:
+    return f"DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table}"
+
+
+def search_vector_backfill(table: str) -> str:
+    """既存の行の search_vector を id の範囲ごとに計算する（:start < id <= :end）"""
+    return (
+        f"UPDATE {table} SET search_vector = public.ja_ngram_tsvector(content) "
+        f"WHERE id > :start AND id <= :end AND search_vector IS NULL"
+    )
+
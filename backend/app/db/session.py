@@ -1,6 +1,8 @@
 import os
 import logging
+import threading
 import traceback
+from typing import Optional
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -9,6 +11,45 @@ from sqlalchemy.orm import sessionmaker
 from google.cloud.sql.connector import Connector
 import pg8000
 
+# コネクションプールの設定
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Cloud SQL側で切断される前に接続を張り直す秒数
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# 起動時にあらかじめ開いておく接続数（0で無効）
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))
+
+# Cloud SQL Connectorはプロセスで1つだけ作成して使い回す
+# （接続ごとに作るとリフレッシュ用スレッド・鍵ペア・証明書の取得が毎回発生する）
+_connector: Optional[Connector] = None
+_connector_lock = threading.Lock()
+
+def get_connector() -> Connector:
+    global _connector
+    with _connector_lock:
+        if _connector is None:
+            _connector = Connector()
+        return _connector
+
+def close_connector() -> None:
+    """Cloud SQL Connectorを閉じる（シャットダウン時に呼び出す）"""
+    global _connector
+    with _connector_lock:
+        if _connector is not None:
+            _connector.close()
+            _connector = None
+
+def get_pool_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 def get_engine():
     DB_HOST = os.getenv("DB_HOST", "localhost")
     DB_USER = os.getenv("DB_USER", "postgres")
@@ -23,7 +64,7 @@ def get_engine():
         # Cloud SQL Auth Proxy経由（Cloud Run環境）
         if DB_HOST.startswith("/cloudsql/") or INSTANCE_CONNECTION_NAME:
             def getconn():
-                connector = Connector()
+                connector = get_connector()
                 logging.info("Cloud SQL Auth Proxy経由でDB接続を試みます")
                 print("Cloud SQL Auth Proxy経由でDB接続を試みます")
                 conn = connector.connect(
@@ -39,6 +80,7 @@ def get_engine():
             engine = create_engine(
                 "postgresql+pg8000://",
                 creator=getconn,
+                **get_pool_options()
             )
         else:
             # ローカルや通常のTCP接続
@@ -46,7 +88,7 @@ def get_engine():
             DATABASE_URL = f"postgresql+pg8000://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
             logging.info(f"ローカル/TCPでDB接続を試みます: {DATABASE_URL}")
             print(f"ローカル/TCPでDB接続を試みます: {DATABASE_URL}")
-            engine = create_engine(DATABASE_URL)
+            engine = create_engine(DATABASE_URL, **get_pool_options())
         logging.info("DBエンジン作成成功")
         print("DBエンジン作成成功")
         return engine
@@ -61,6 +103,28 @@ engine = get_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def warm_up_pool(size: int = DB_POOL_WARMUP) -> int:
+    """
+    コネクションプールに接続をあらかじめ開いておく（起動時に呼び出す）
+
+    スケールアウト直後の最初のリクエストが接続確立の待ち時間を負担しないようにする。
+
+    Returns:
+        int: 開いた接続数
+    """
+    connections = []
+    try:
+        for _ in range(min(size, DB_POOL_SIZE)):
+            connections.append(engine.connect())
+    except Exception as e:
+        logging.warning(f"コネクションプールのウォームアップに失敗しました: {e}")
+    finally:
+        # 接続を閉じるとプールに戻り、次のリクエストで再利用される
+        for conn in connections:
+            conn.close()
+    logging.info(f"コネクションプールのウォームアップ完了: {len(connections)}件")
+    return len(connections)
+
 def get_db():
     db = SessionLocal()
     try:
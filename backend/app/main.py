@@ -15,13 +15,16 @@ except Exception as e:
     print(f"Google AIの初期化エラー: {e}")
 
 from app.routers import speech, analysis, proposals, users, projects
-from app.db.session import engine
+from app.db.session import engine, warm_up_pool, close_connector
+from app.db.async_session import close_async_engine
 from app.db import models
 from app.routers import issues  # 論点APIルーターを追加
 from .routers import agreements
 from .routers import signatures
 from .routers import estates
 from .routers import invitations
+from .routers import jobs
+from app.services.jobs import job_worker
 
 # データベースのテーブル作成
 # models.Base.metadata.create_all(bind=engine)  # Alembicを使うのでコメントアウト
@@ -42,6 +45,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # ページングのカーソルをブラウザから読めるようにする
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ルーターの登録
@@ -55,6 +60,34 @@ app.include_router(agreements.router)
 app.include_router(signatures.router)
 app.include_router(estates.router)
 app.include_router(invitations.router, prefix="/api/invitations", tags=["Invitations"])
+app.include_router(jobs.router)
+
+# ジョブワーカーは通常 python -m app.worker で別プロセスとして起動する
+# （APIサーバーのインスタンスごとにワーカーが増えないよう、同じプロセスで動かす場合は明示的に true を設定する）
+JOB_WORKER_IN_PROCESS = os.getenv("JOB_WORKER_IN_PROCESS", "false").lower() == "true"
+
+@app.on_event("startup")
+def warm_up_db_pool():
+    # 最初のリクエストで接続確立を待たないよう、コネクションプールに接続を開いておく
+    warm_up_pool()
+
+@app.on_event("startup")
+def start_job_worker():
+    if JOB_WORKER_IN_PROCESS:
+        job_worker.start()
+
+@app.on_event("shutdown")
+def stop_job_worker():
+    job_worker.stop(timeout=10)
+
+@app.on_event("shutdown")
+def close_db_connections():
+    engine.dispose()
+    close_connector()
+
+@app.on_event("shutdown")
+async def close_async_db_connections():
+    await close_async_engine()
 
 @app.get("/", tags=["Root"])
 async def read_root():
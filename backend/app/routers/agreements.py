@@ -4,32 +4,30 @@ from ..db import models, schemas, crud
 from ..db.session import get_db
 from typing import List
 from ..services import ai_service
+from ..services.jobs import job_accepted_response, submit_job
 
 router = APIRouter(prefix="/api/agreements", tags=["Agreements"])
 
-@router.post("/ai/generate", response_model=schemas.Agreement)
+@router.post("/ai/generate", response_model=schemas.Agreement, responses={202: {"model": schemas.JobStatus}})
 def generate_agreement_ai(
     project_id: int,
     proposal_id: int,
+    async_mode: bool = False,
     db: Session = Depends(get_db)
 ):
-    proposal = db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
-    if not proposal:
+    if async_mode:
+        # ジョブとして登録し、ジョブIDをすぐに返す（結果は /api/jobs/{job_id}/result で取得）
+        db_job = submit_job(
+            db,
+            "agreements.generate",
+            {"project_id": project_id, "proposal_id": proposal_id},
+            project_id=project_id
+        )
+        return job_accepted_response(db_job)
+    # Gemini LLMで協議書タイトルと本文を生成して保存
+    agreement = ai_service.create_agreement_with_llm(db, project_id=project_id, proposal_id=proposal_id)
+    if not agreement:
         raise HTTPException(status_code=404, detail="Proposal not found")
-    # Gemini LLMで協議書タイトルと本文を生成
-    agreement_result = ai_service.generate_agreement_content_with_llm(
-        project_title=proposal.title,
-        proposal_content=proposal.content
-    )
-    agreement_in = schemas.AgreementCreate(
-        project_id=project_id,
-        proposal_id=proposal_id,
-        title=agreement_result["title"],
-        content=agreement_result["content"],
-        status="draft",
-        is_signed=False
-    )
-    agreement = crud.create_agreement(db, agreement_in)
     return agreement
 
 @router.get("/", response_model=schemas.Agreement)
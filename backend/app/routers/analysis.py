@@ -1,13 +1,18 @@
 import os
 import json
-from fastapi import APIRouter, Body, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, HTTPException, status, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 import google.generativeai as genai
-from threading import Lock
-from app.services.ai_service import generate_ai_chat_reply
+from app.services.ai_service import generate_ai_chat_reply, stream_ai_chat_reply, analyze_sentiments_batch
+from app.services.llm_gateway import llm_gateway
+from app.services.sentiment_lexicon import try_local_sentiment, sentiment_routing_stats
+from app.services.single_flight import single_flight
+from app.db import crud, schemas
 from app.db.schemas import AiChatRequest, AiChatResponse
+from app.db.session import SessionLocal, get_db
 
 router = APIRouter(prefix="/api/analysis", tags=["Analysis"])
 
@@ -17,7 +22,6 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
 
 # Gemini APIの初期化
-lock = Lock()
 try:
     if GEMINI_API_KEY:
         genai.configure(api_key=GEMINI_API_KEY)
@@ -34,6 +38,13 @@ class TextInput(BaseModel):
     user_id: Optional[str] = None
     context: Optional[str] = None
 
+class SentimentBatchInput(BaseModel):
+    texts: Optional[List[str]] = None
+    project_id: Optional[int] = None
+    user_id: Optional[int] = None
+    only_missing: bool = True
+    context: Optional[str] = None
+
 class ConversationInput(BaseModel):
     messages: List[Dict[str, Any]]
     project_id: Optional[str] = None
@@ -53,10 +64,18 @@ async def analyze_sentiment(input_data: TextInput):
     - **sentiment_score**: 感情スコア（0.0〜1.0、1.0が最もポジティブ）
     - **is_positive**: ポジティブな感情かどうか
     - **keywords**: 感情に関連するキーワード
+
+    短く明確なテキストは辞書ベースのローカル判定で即座に返し、曖昧なテキストのみGemini APIで分析します。
     """
     try:
         text = input_data.text
         context = input_data.context or "遺産相続に関する会話"
+        local_result = try_local_sentiment(text)
+        if local_result is not None:
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content=local_result
+            )
         print("Gemini APIを使用して感情分析を実行します")
         prompt = f"""
 あなたは感情分析AIアシスタントです。以下のテキストの感情を分析し、JSONフォーマットで結果を返してください。
@@ -80,28 +99,25 @@ async def analyze_sentiment(input_data: TextInput):
 
 説明などは不要です。JSONのみを返してください。
 """
-        with lock:
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            result_text = response.text.strip()
-            try:
-                if "```json" in result_text:
-                    json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                elif "```" in result_text:
-                    json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                else:
-                    result = json.loads(result_text)
-                if "sentiment_score" not in result or "is_positive" not in result or "keywords" not in result:
-                    raise ValueError("APIレスポンスに必要なフィールドがありません")
-                return JSONResponse(
-                    status_code=status.HTTP_200_OK,
-                    content=result
-                )
-            except json.JSONDecodeError as e:
-                print(f"JSONパースエラー: {e}, テキスト: {result_text}")
-                raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
+        result_text = (await llm_gateway.agenerate(prompt, model_name=GEMINI_MODEL)).strip()
+        try:
+            if "```json" in result_text:
+                json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            elif "```" in result_text:
+                json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            else:
+                result = json.loads(result_text)
+            if "sentiment_score" not in result or "is_positive" not in result or "keywords" not in result:
+                raise ValueError("APIレスポンスに必要なフィールドがありません")
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={**result, "source": "llm"}
+            )
+        except json.JSONDecodeError as e:
+            print(f"JSONパースエラー: {e}, テキスト: {result_text}")
+            raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
     except Exception as e:
         print(f"感情分析中にエラーが発生しました: {str(e)}")
         raise HTTPException(
@@ -109,6 +125,61 @@ async def analyze_sentiment(input_data: TextInput):
             detail=f"感情分析中にエラーが発生しました: {str(e)}"
         )
 
+@router.get("/sentiment/stats", summary="感情分析のローカル判定率")
+def get_sentiment_stats():
+    """
+    感情分析リクエストのうち、辞書ベースのローカル判定で処理した割合（local_ratio）と
+    Gemini APIにエスカレーションした件数を返します。
+    """
+    return sentiment_routing_stats.stats()
+
+@router.post("/sentiment/batch", summary="複数テキストの一括感情分析")
+async def analyze_sentiment_batch(input_data: SentimentBatchInput, db: Session = Depends(get_db)):
+    """
+    複数のテキスト、またはプロジェクトの会話の感情をまとめて分析します。
+    テキストは複数件ずつ1回のLLM呼び出しで分析されます。
+
+    - **texts**: 分析するテキストのリスト（project_idと併用不可）
+    - **project_id**: 指定した場合、プロジェクトの会話を分析して conversations.sentiment に一括で保存
+    - **user_id**: project_id指定時に対象を特定ユーザーの会話に絞る
+    - **only_missing**: project_id指定時、感情が未設定の会話のみを対象にする（デフォルト: true）
+
+    返却値:
+    - **results**: 各テキスト（または会話）の分析結果（sentiment_score, is_positive, sentiment）
+    - **updated_count**: conversations.sentiment を更新した件数
+    """
+    if (input_data.texts is None) == (input_data.project_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="texts または project_id のどちらか一方を指定してください"
+        )
+    context = input_data.context or "遺産相続に関する会話"
+
+    if input_data.texts is not None:
+        analyses = await analyze_sentiments_batch(input_data.texts, context)
+        results = [
+            {"index": i, **analysis} if analysis else {"index": i, "error": "分析できませんでした"}
+            for i, analysis in enumerate(analyses)
+        ]
+        return {"results": results, "updated_count": 0}
+
+    conversations = crud.get_conversations_for_sentiment(
+        db, project_id=input_data.project_id, user_id=input_data.user_id, only_missing=input_data.only_missing
+    )
+    analyses = await analyze_sentiments_batch(
+        [conv.content for conv in conversations], context, project_id=input_data.project_id
+    )
+    results = []
+    sentiments: Dict[int, str] = {}
+    for conv, analysis in zip(conversations, analyses):
+        if analysis:
+            sentiments[conv.id] = analysis["sentiment"]
+            results.append({"conversation_id": conv.id, **analysis})
+        else:
+            results.append({"conversation_id": conv.id, "error": "分析できませんでした"})
+    updated_count = crud.bulk_update_conversation_sentiments(db, sentiments)
+    return {"results": results, "updated_count": updated_count}
+
 @router.post("/issues", summary="会話から論点を抽出")
 async def extract_issues(input_data: ConversationInput):
     """
@@ -162,28 +233,25 @@ async def extract_issues(input_data: ConversationInput):
 遺産相続において重要な論点に焦点を当ててください（例：不動産の扱い、預金の分割、相続税の負担など）。
 説明などは不要です。JSONのみを返してください。
 """
-        with lock:
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            result_text = response.text.strip()
-            try:
-                if "```json" in result_text:
-                    json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                elif "```" in result_text:
-                    json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                else:
-                    result = json.loads(result_text)
-                if "issues" not in result or "total_issues_count" not in result:
-                    raise ValueError("APIレスポンスに必要なフィールドがありません")
-                return JSONResponse(
-                    status_code=status.HTTP_200_OK,
-                    content=result
-                )
-            except json.JSONDecodeError as e:
-                print(f"JSONパースエラー: {e}, テキスト: {result_text}")
-                raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
+        result_text = (await llm_gateway.agenerate(prompt, project_id=project_id, model_name=GEMINI_MODEL)).strip()
+        try:
+            if "```json" in result_text:
+                json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            elif "```" in result_text:
+                json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            else:
+                result = json.loads(result_text)
+            if "issues" not in result or "total_issues_count" not in result:
+                raise ValueError("APIレスポンスに必要なフィールドがありません")
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content=result
+            )
+        except json.JSONDecodeError as e:
+            print(f"JSONパースエラー: {e}, テキスト: {result_text}")
+            raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
     except Exception as e:
         print(f"論点抽出中にエラーが発生しました: {str(e)}")
         raise HTTPException(
@@ -237,28 +305,25 @@ async def update_issue_status(updates: List[IssueUpdate]):
 合意度スコアは0〜100の範囲内であることを確認し、極端な変更（例：20%から90%への急激な変化）には注意してください。
 説明などは不要です。JSONのみを返してください。
 """
-        with lock:
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            result_text = response.text.strip()
-            try:
-                if "```json" in result_text:
-                    json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                elif "```" in result_text:
-                    json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                else:
-                    result = json.loads(result_text)
-                if "success" not in result or "updated_issues" not in result:
-                    raise ValueError("APIレスポンスに必要なフィールドがありません")
-                return JSONResponse(
-                    status_code=status.HTTP_200_OK,
-                    content=result
-                )
-            except json.JSONDecodeError as e:
-                print(f"JSONパースエラー: {e}, テキスト: {result_text}")
-                raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
+        result_text = (await llm_gateway.agenerate(prompt, model_name=GEMINI_MODEL)).strip()
+        try:
+            if "```json" in result_text:
+                json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            elif "```" in result_text:
+                json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            else:
+                result = json.loads(result_text)
+            if "success" not in result or "updated_issues" not in result:
+                raise ValueError("APIレスポンスに必要なフィールドがありません")
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content=result
+            )
+        except json.JSONDecodeError as e:
+            print(f"JSONパースエラー: {e}, テキスト: {result_text}")
+            raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
     except Exception as e:
         print(f"論点更新中にエラーが発生しました: {str(e)}")
         raise HTTPException(
@@ -267,12 +332,80 @@ async def update_issue_status(updates: List[IssueUpdate]):
         )
 
 @router.post("/ai/chat", response_model=AiChatResponse, summary="AI相談員による会話応答")
-async def ai_chat(request: AiChatRequest):
+async def ai_chat(request: AiChatRequest, db: Session = Depends(get_db)):
     """
     AI相談員が会話履歴とユーザー発言をもとに専門的な返答を生成します。
     """
     try:
-        result = generate_ai_chat_reply(request.messages, request.user_message, request.project_id, request.user_id)
+        result = await generate_ai_chat_reply(request.messages, request.user_message, request.project_id, request.user_id, db=db)
         return AiChatResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI応答生成エラー: {str(e)}") 
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Server-Sent Events形式の1イベントを組み立てる"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/ai/chat/stream", summary="AI相談員による会話応答（ストリーミング）")
+async def ai_chat_stream(request: AiChatRequest):
+    """
+    AI相談員の返答を生成されたそばからServer-Sent Eventsで返します。
+
+    イベント:
+    - **token**: 生成されたテキストの断片（`{"text": "..."}`）
+    - **done**: 生成完了。組み立てた返答全体と保存した会話ID（`{"reply": "...", "conversation_id": 1}`）
+    - **error**: 生成中のエラー（`{"detail": "..."}`）
+
+    project_id が指定されている場合、返答全体を「AI相談員」の会話として保存します。
+    """
+    async def event_stream():
+        # レスポンス本体の送信中に使うため、リクエスト単位の get_db ではなくストリーム内でセッションを開いて閉じる
+        # （依存関係のセッションはレスポンスの送信前に閉じられる場合がある）
+        db = SessionLocal()
+        try:
+            chunks: List[str] = []
+            try:
+                async for chunk in stream_ai_chat_reply(request.messages, request.user_message, request.project_id, request.user_id, db=db):
+                    chunks.append(chunk)
+                    yield _sse_event("token", {"text": chunk})
+            except Exception as e:
+                print(f"AI応答のストリーミング中にエラーが発生しました: {str(e)}")
+                yield _sse_event("error", {"detail": f"AI応答生成エラー: {str(e)}"})
+                return
+
+            reply = "".join(chunks).strip()
+            conversation_id = None
+            if request.project_id is not None and reply:
+                # ストリーム完了後に返答全体を会話として保存
+                conversation = crud.create_conversation(db, schemas.ConversationCreate(
+                    project_id=request.project_id,
+                    user_id=request.user_id,
+                    content=reply,
+                    speaker="AI相談員",
+                    sentiment="neutral"
+                ))
+                conversation_id = conversation.id
+            yield _sse_event("done", {
+                "reply": reply,
+                "project_id": request.project_id,
+                "user_id": request.user_id,
+                "conversation_id": conversation_id
+            })
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/llm/stats", summary="LLMゲートウェイの統計情報")
+def get_llm_stats():
+    """
+    LLMゲートウェイの同時実行数・キュー長・キャッシュヒット率・
+    ストリーミングの最初のトークンまでの時間（avg_ttft_ms）などの統計情報を返します。
+    負荷試験時の同時実行上限（LLM_MAX_CONCURRENCY）の調整に利用します。
+    single_flight は同時に届いた同一の論点抽出・提案生成リクエストを合流させた件数です。
+    """
+    return {**llm_gateway.stats(), "single_flight": single_flight.stats()}
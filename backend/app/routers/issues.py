@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Literal
 from pydantic import BaseModel
 
-from app.db import crud, schemas
-from app.db.session import get_db
-from app.services.ai_service import extract_issues_from_conversations
+from app.db import async_crud, crud, schemas
+from app.db.session import SessionLocal, get_db
+from app.db.async_session import get_async_db
+from app.db.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
+from app.services.issue_extraction import extract_project_issues
+from app.services.jobs import job_accepted_response, submit_job
+from app.services.single_flight import make_flight_key, single_flight
 
 router = APIRouter()
 
@@ -17,19 +22,54 @@ class IssuesBatchCreate(BaseModel):
 # 論点抽出用リクエストスキーマ
 class ExtractIssuesRequest(BaseModel):
     project_id: int
+    mode: Literal["full", "incremental"] = "full"  # incremental: 前回以降の会話だけを追加で集計する
+    async_mode: bool = False  # Trueの場合はジョブとして登録し、ジョブIDをすぐに返す
 
 @router.get("/", response_model=List[schemas.Issue])
-def read_issues(
+async def read_issues(
+    response: Response,
     project_id: Optional[int] = None,
     user_id: Optional[int] = None,
     skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1), 
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """論点一覧を取得する（プロジェクトIDとユーザーIDによるフィルタリング可能）"""
-    issues = crud.get_issues(db, project_id=project_id, user_id=user_id, skip=skip, limit=limit)
+    """
+    論点一覧を取得する（プロジェクトIDとユーザーIDによるフィルタリング可能）
+
+    作成日時順に返し、続きがある場合は X-Next-Cursor ヘッダーのカーソルを cursor に指定して次のページを取得する。
+    """
+    try:
+        after = decode_cursor(cursor, skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 次のページの有無を判定するため1件多く取得する
+    issues = await async_crud.get_issues(db, project_id=project_id, user_id=user_id, skip=skip, limit=limit + 1, after=after)
+    issues, next_cursor = split_page(issues, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return issues
 
+# /{issue_id} より前に定義する（後に定義すると "summary" が論点IDとして解釈される）
+@router.get("/summary", response_model=schemas.IssueSummary)
+def get_issue_summary(
+    project_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """分類・タイプ・合意度ごとの論点数を返すサマリーAPI（ユーザーIDの論点を集計し、プロジェクトIDで絞り込み可能）"""
+    return crud.get_issue_summary(db, project_id=project_id, user_id=user_id)
+
+@router.get("/summary/projects", response_model=List[schemas.IssueSummary])
+def get_issue_summaries(
+    project_ids: List[int] = Query(...),
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """複数プロジェクトの論点サマリーを1回の集計クエリでまとめて返す（?project_ids=1&project_ids=2&user_id=3）"""
+    return crud.get_issue_summaries(db, project_ids=project_ids, user_id=user_id)
+
 @router.get("/{issue_id}", response_model=schemas.Issue)
 def read_issue(issue_id: int, db: Session = Depends(get_db)):
     """特定の論点を取得する"""
@@ -51,71 +91,48 @@ def create_issues_batch(issues_data: IssuesBatchCreate, db: Session = Depends(ge
     if db_project is None:
         raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
     
-    # 論点を作成
-    created_issues = []
-    for issue_base in issues_data.issues:
-        issue_create = schemas.IssueCreate(
-            project_id=issues_data.project_id,
-            content=issue_base.content,
-            type=issue_base.type,
-            agreement_level=issue_base.agreement_level
-        )
-        created_issue = crud.create_issue(db=db, issue=issue_create)
-        created_issues.append(created_issue)
-    
-    return created_issues
+    # 論点をまとめて作成（1回のINSERTとコミット）
+    return crud.create_issues_batch(db, [
+        schemas.IssueCreate(project_id=issues_data.project_id, **issue_base.dict())
+        for issue_base in issues_data.issues
+    ])
 
-@router.post("/extract", response_model=Dict[str, Any])
+@router.post("/extract", response_model=Dict[str, Any], responses={202: {"model": schemas.JobStatus}})
 async def extract_issues(request: ExtractIssuesRequest, user_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """会話から論点を抽出して保存する"""
+    """
+    会話から論点を抽出して保存する
+
+    mode=incremental の場合は前回の抽出以降に追加された会話だけを集計し、
+    論点タイプ・合意度が変わった論点のみLLMで生成し直す。
+    async_mode=true の場合はジョブとして登録し、202 とジョブ情報を返す。
+    """
     # プロジェクトの存在確認
     db_project = crud.get_project(db, project_id=request.project_id)
     if db_project is None:
         raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
     
-    # 既存の論点を削除（新しく抽出したものに置き換える）
-    crud.delete_project_issues(db, project_id=request.project_id, user_id=user_id)
-    
-    # 会話データを取得
-    conversations = crud.get_conversations_ordered_by_timestamp(db, project_id=request.project_id, user_id=user_id)
-    
-    # 会話データがない場合
-    if not conversations:
-        return {"message": "会話データがありません", "issues": []}
-    
-    # 会話から論点を抽出（AIサービスを使用）
-    extracted_issues = await extract_issues_from_conversations(conversations)
-    
-    # 抽出された論点をDBに保存
-    saved_issues = []
-    for issue in extracted_issues:
-        issue_create = schemas.IssueCreate(
+    if request.async_mode:
+        db_job = submit_job(
+            db,
+            "issues.extract",
+            {"project_id": request.project_id, "user_id": user_id, "mode": request.mode},
             project_id=request.project_id,
-            user_id=user_id,  # ユーザーIDを設定
-            topic=issue.get("topic"),
-            content=issue.get("content"),
-            type=issue["type"],
-            agreement_level=issue.get("agreement_level")
-        )
-        db_issue = crud.create_issue(db=db, issue=issue_create)
-        # モデルオブジェクトをスキーマに変換
-        issue_schema = schemas.Issue(
-            id=db_issue.id,
-            project_id=db_issue.project_id,
-            user_id=db_issue.user_id,
-            topic=db_issue.topic,
-            content=db_issue.content,
-            type=db_issue.type,
-            agreement_level=db_issue.agreement_level,
-            created_at=db_issue.created_at,
-            updated_at=db_issue.updated_at
+            user_id=user_id
         )
-        saved_issues.append(issue_schema)
+        return job_accepted_response(db_job)
     
-    return {
-        "message": f"{len(saved_issues)}件の論点を抽出しました",
-        "issues": saved_issues
-    }
+    # 同じ抽出が実行中の場合は合流して結果を共有する（削除→再作成の重複実行を防ぐ）
+    flight_key = make_flight_key("issues.extract", request.project_id, {"user_id": user_id, "mode": request.mode})
+
+    async def extract():
+        # 合流した呼び出し元より長く動く場合があるため、リクエスト単位のセッションではなく専用のセッションを使う
+        flight_db = SessionLocal()
+        try:
+            return await extract_project_issues(flight_db, project_id=request.project_id, user_id=user_id, mode=request.mode)
+        finally:
+            flight_db.close()
+
+    return await single_flight.do(flight_key, extract)
 
 @router.put("/{issue_id}", response_model=schemas.Issue)
 def update_issue(
@@ -139,15 +156,3 @@ def delete_issue(issue_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="論点が見つかりません")
     return success
 
-@router.get("/summary", response_model=Dict[str, int])
-def get_issue_summary(
-    project_id: Optional[int] = None,
-    db: Session = Depends(get_db)
-):
-    """各分類ごとの論点数を返すサマリーAPI"""
-    issues = crud.get_issues(db, project_id=project_id)
-    summary = {"agreed": 0, "discussing": 0, "disagreed": 0}
-    for issue in issues:
-        if hasattr(issue, "classification") and issue.classification:
-            summary[str(issue.classification)] += 1
-    return summary 
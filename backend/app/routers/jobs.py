@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Any
+
+from app.db import crud, schemas
+from app.db.session import get_db
+from app.services.jobs import job_accepted_response, load_job_result, submit_job, validate_job_payload
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+@router.post("/", response_model=schemas.JobStatus, status_code=status.HTTP_202_ACCEPTED)
+def create_job(job: schemas.JobCreate, db: Session = Depends(get_db)):
+    """時間のかかるAI処理をジョブとして登録する（結果は /api/jobs/{job_id}/result で取得）"""
+    # 未対応の種別や、種別ごとのスキーマに合わない入力は登録せずに 400 を返す
+    try:
+        payload = validate_job_payload(job.job_type, job.payload)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    db_job = submit_job(db, job.job_type, payload, project_id=job.project_id, user_id=job.user_id)
+    return job_accepted_response(db_job)
+
+@router.get("/{job_id}", response_model=schemas.JobStatus)
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    """ジョブの状態を取得する"""
+    db_job = crud.get_job(db, job_id=job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return db_job
+
+@router.get("/{job_id}/result", response_model=Any)
+def read_job_result(job_id: int, db: Session = Depends(get_db)):
+    """完了したジョブの結果を取得する（未完了・失敗の場合は409）"""
+    db_job = crud.get_job(db, job_id=job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    if db_job.status != "succeeded":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"status": db_job.status, "error": db_job.error}
+        )
+    return load_job_result(db_job)
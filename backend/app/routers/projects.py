@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Literal
 from pydantic import BaseModel
 from sqlalchemy.exc import IntegrityError
 import logging
 
-from app.db import crud, schemas
+from app.db import async_crud, crud, schemas
 from app.db.session import get_db
+from app.db.async_session import get_async_db
+from app.db.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
 from app.services.invitation_service import InvitationService
 from app.services.email_service import EmailService
+from app.services.search_service import search_project
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# プロジェクト詳細に含められるセクションと、会話・提案・論点それぞれの最大件数
+PROJECT_DETAIL_SECTIONS = ("conversations", "proposals", "issues", "members")
+PROJECT_DETAIL_EMBED_LIMIT = 20
+PROJECT_DETAIL_MAX_EMBED_LIMIT = 100
+
 # 会話メッセージの保存用スキーマ
 class ConversationMessageCreate(BaseModel):
     project_id: int
@@ -83,36 +92,136 @@ def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)
     return db_project
 
 @router.get("/", response_model=List[schemas.ProjectDetail])
-def read_projects(user_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """プロジェクト一覧を取得する（ユーザーIDによるフィルタリング可能）"""
+def read_projects(
+    response: Response,
+    user_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    プロジェクト一覧を取得する（ユーザーIDによるフィルタリング可能）
+
+    作成日時順に返し、続きがある場合は X-Next-Cursor ヘッダーのカーソルを cursor に指定して次のページを取得する。
+    """
+    try:
+        after = decode_cursor(cursor, skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 次のページの有無を判定するため1件多く取得する
+    # メンバーは selectinload でまとめて取得する（件数によらずクエリは2回）
     if user_id:
         # 指定されたユーザーが作成または参加しているプロジェクトを取得
-        projects = crud.get_projects_for_user(db, user_id=user_id, skip=skip, limit=limit)
+        projects = crud.get_projects_for_user(db, user_id=user_id, skip=skip, limit=limit + 1, with_members=True, after=after)
     else:
         # 全プロジェクトを取得
-        projects = crud.get_projects(db, skip=skip, limit=limit)
+        projects = crud.get_projects(db, skip=skip, limit=limit + 1, with_members=True, after=after)
+    projects, next_cursor = split_page(projects, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-    result = []
-    for p in projects:
-        members = crud.get_project_members(db, p.id)
-        result.append(
-            schemas.ProjectDetail(
-                **p.__dict__,
-                conversations=[],
-                proposals=[],
-                issues=[],
-                members=members
-            )
+    # 会話・提案・論点は一覧では返さないため、遅延読み込みが起きないよう明示的に組み立てる
+    return [
+        schemas.ProjectDetail(
+            **schemas.Project.model_validate(p).model_dump(),
+            conversations=[],
+            proposals=[],
+            issues=[],
+            members=[schemas.ProjectMember.model_validate(m) for m in p.members],
+            member_count=len(p.members)
         )
+        for p in projects
+    ]
+
+# /{project_id} より前に定義する（後に定義すると "dashboard" がプロジェクトIDとして解釈される）
+@router.get("/dashboard", response_model=List[schemas.ProjectDashboardItem])
+def read_dashboard(user_id: int, limit: int = Query(100, ge=1), db: Session = Depends(get_db)):
+    """
+    ユーザーが作成または参加しているプロジェクトごとに、ダッシュボード表示用の集計をまとめて返す
+
+    メンバー数・論点の分類ごとの件数・提案数・協議書の状態と署名の進み具合を含む。
+    論点と提案はプロジェクト画面と同じくユーザー自身のものを数える。
+    プロジェクト数によらず、集計クエリは5回で済む。
+    """
+    projects = crud.get_projects_for_user(db, user_id=user_id, limit=limit)
+    project_ids = [p.id for p in projects]
+
+    member_counts = crud.count_by_project(db, "members", project_ids)
+    proposal_counts = crud.count_by_project(db, "proposals", project_ids, user_id=user_id)
+    issue_summaries = crud.get_issue_summaries(db, project_ids=project_ids, user_id=user_id)
+    agreements = crud.get_latest_agreements_with_signature_counts(db, project_ids)
+
+    result = []
+    for p, issue_summary in zip(projects, issue_summaries):
+        member_count = member_counts.get(p.id, 0)
+        agreement = agreements.get(p.id)
+        result.append(schemas.ProjectDashboardItem(
+            **schemas.Project.model_validate(p).model_dump(),
+            member_count=member_count,
+            issue_summary=issue_summary,
+            proposal_count=proposal_counts.get(p.id, 0),
+            agreement=schemas.AgreementProgress(
+                agreement_id=agreement.id,
+                status=agreement.status,
+                is_signed=bool(agreement.is_signed),
+                signature_count=agreement.signature_count,
+                required_signatures=member_count
+            ) if agreement is not None else None
+        ))
     return result
 
 @router.get("/{project_id}", response_model=schemas.ProjectDetail)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    """特定のプロジェクトの詳細情報を取得する"""
-    db_project = crud.get_project(db, project_id=project_id)
+def read_project(
+    project_id: int,
+    include: Optional[str] = None,
+    limit: int = Query(PROJECT_DETAIL_EMBED_LIMIT, ge=0, le=PROJECT_DETAIL_MAX_EMBED_LIMIT),
+    db: Session = Depends(get_db)
+):
+    """
+    特定のプロジェクトの詳細情報を取得する
+
+    - include: 含めるセクションをカンマ区切りで指定（conversations,proposals,issues,members。省略時はすべて）
+    - limit: 会話・提案・論点はそれぞれ新しい順に最大limit件まで含める（全件数は *_count で返す）
+    """
+    if include is None:
+        sections = list(PROJECT_DETAIL_SECTIONS)
+    else:
+        sections = [section.strip() for section in include.split(",") if section.strip()]
+        unknown = [section for section in sections if section not in PROJECT_DETAIL_SECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"includeに指定できない値です: {', '.join(unknown)}")
+
+    # セクションごとに決まった回数のクエリで取得し、遅延読み込みは起こさない
+    db_project = crud.get_project(db, project_id=project_id, with_members="members" in sections)
     if db_project is None:
         raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
-    return db_project
+    counts = crud.count_project_sections(db, project_id, sections)
+
+    detail = schemas.ProjectDetail(**schemas.Project.model_validate(db_project).model_dump())
+    if "conversations" in sections:
+        detail.conversations = [
+            schemas.Conversation.model_validate(c)
+            for c in crud.get_recent_project_rows(db, "conversations", project_id, limit)
+        ]
+        detail.conversation_count = counts["conversations"]
+    if "proposals" in sections:
+        detail.proposals = [
+            schemas.Proposal.model_validate(p)
+            for p in crud.get_recent_project_rows(db, "proposals", project_id, limit)
+        ]
+        detail.proposal_count = counts["proposals"]
+    if "issues" in sections:
+        detail.issues = [
+            schemas.Issue.model_validate(i)
+            for i in crud.get_recent_project_rows(db, "issues", project_id, limit)
+        ]
+        detail.issue_count = counts["issues"]
+    if "members" in sections:
+        detail.members = [schemas.ProjectMember.model_validate(m) for m in db_project.members]
+        detail.member_count = counts["members"]
+    return detail
 
 @router.put("/{project_id}", response_model=schemas.Project)
 def update_project(project_id: int, project: schemas.ProjectBase, db: Session = Depends(get_db)):
@@ -136,20 +245,75 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=409, detail="関連データが残っているため削除できません")
 
+@router.get("/{project_id}/search", response_model=List[schemas.SearchHit])
+def search_project_history(
+    project_id: int,
+    q: str = Query(..., min_length=1),
+    user_id: int = Query(...),
+    include: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    プロジェクトの会話・論点・提案を全文検索する（関連度の高い順、一致箇所を<mark>で囲んだ抜粋付き）
+
+    - q: 検索語（空白区切りで複数指定した場合はすべてを含むものを返す）
+    - include: 検索対象をカンマ区切りで指定（conversations,issues,proposals。省略時はすべて）
+    """
+    if include is None:
+        sections = list(crud.SEARCHABLE_SECTIONS)
+    else:
+        sections = [section.strip() for section in include.split(",") if section.strip()]
+        unknown = [section for section in sections if section not in crud.SEARCHABLE_SECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"includeに指定できない値です: {', '.join(unknown)}")
+
+    db_project = crud.get_project(db, project_id=project_id)
+    if db_project is None:
+        raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+    return search_project(db, project_id, user_id, q, sections, limit)
+
 # 会話関連のエンドポイント
 @router.get("/{project_id}/conversations", response_model=List[Dict[str, Any]])
-def read_project_conversations(
+async def read_project_conversations(
     project_id: int, 
+    response: Response,
     user_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """特定のプロジェクトの会話履歴を取得する（ユーザーIDでフィルタリング可能）"""
-    db_project = crud.get_project(db, project_id=project_id)
+    """
+    特定のプロジェクトの会話履歴を取得する（ユーザーIDでフィルタリング可能）
+
+    - limit を省略した場合は全件を返す
+    - limit を指定した場合は1ページ分を返し、続きがあれば X-Next-Cursor ヘッダーのカーソルを cursor に指定して取得する
+    - order=desc で新しい順（過去に遡って読み込む場合）
+    """
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 参照回数が多いため、スレッドプールを使わずイベントループ上で非同期に取得する
+    db_project = await async_crud.get_project(db, project_id=project_id)
     if db_project is None:
         raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-    # 会話データを取得 - タイムスタンプでソート済みのデータを取得
-    conversations = crud.get_conversations_ordered_by_timestamp(db, project_id=project_id, user_id=user_id)
+    # 会話データを取得 - タイムスタンプでソート済みのデータを取得（次のページの有無を判定するため1件多く取得）
+    conversations = await async_crud.get_conversations_ordered_by_timestamp(
+        db,
+        project_id=project_id,
+        user_id=user_id,
+        limit=limit + 1 if limit is not None else None,
+        after=after,
+        descending=order == "desc"
+    )
+    if limit is not None:
+        conversations, next_cursor = split_page(conversations, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
     # フロントエンド用に会話データをフォーマット
     result = []
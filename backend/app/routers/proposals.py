@@ -1,16 +1,20 @@
 import os
 import json
 import random
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import google.generativeai as genai
-from threading import Lock
 
 from app.db import crud, schemas
-from app.db.session import get_db
+from app.db.session import SessionLocal, get_db
+from app.db.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
+from app.services.jobs import job_accepted_response, submit_job
+from app.services.llm_gateway import llm_gateway
+from app.services.proposal_service import generate_and_save_proposals
+from app.services.single_flight import make_flight_key, single_flight
 
 router = APIRouter()
 
@@ -20,7 +24,6 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
 
 # Gemini APIの初期化
-lock = Lock()
 try:
     if GEMINI_API_KEY:
         genai.configure(api_key=GEMINI_API_KEY)
@@ -39,12 +42,13 @@ class ProposalRequest(BaseModel):
     issues: List[Dict[str, Any]]
     estate_data: Optional[Dict[str, Any]] = None
     user_preferences: Optional[Dict[str, Any]] = None
+    async_mode: bool = False  # Trueの場合はジョブとして登録し、ジョブIDをすぐに返す
 
 class ComparisonRequest(BaseModel):
     proposals: List[Dict[str, Any]]
     criteria: Optional[List[str]] = None
 
-@router.post("/ai/generate", summary="論点に基づいた提案生成", tags=["AI Proposals"])
+@router.post("/ai/generate", summary="論点に基づいた提案生成", tags=["AI Proposals"], responses={202: {"model": schemas.JobStatus}})
 async def generate_proposals(request: ProposalRequest, user_id: Optional[int] = None, db: Session = Depends(get_db)):
     """
     抽出された論点に基づいて遺産分割の提案を生成します。
@@ -54,123 +58,48 @@ async def generate_proposals(request: ProposalRequest, user_id: Optional[int] =
     返却値:
     - **proposals**: 生成された提案のリスト
     - **recommendation**: 最も推奨される提案ID
+
+    async_mode=true の場合は 202 とジョブ情報を返します。
     """
+    if request.async_mode:
+        # ジョブとして登録し、ジョブIDをすぐに返す（結果は /api/jobs/{job_id}/result で取得）
+        db_job = submit_job(
+            db,
+            "proposals.generate",
+            {**request.dict(exclude={"async_mode"}), "user_id": user_id},
+            project_id=int(request.project_id),
+            user_id=user_id
+        )
+        return job_accepted_response(db_job)
     try:
         print(f"Gemini API ({GEMINI_MODEL}) を使用して提案生成を実行します")
-        project_id = request.project_id
-        issues = request.issues
-        estate_data = request.estate_data or {}
-        user_preferences = request.user_preferences or {}
-        issues_text = "\n".join([
-            f"論点{i+1}: {issue.get('title', 'タイトルなし')} - {issue.get('description', '説明なし')} "
-            f"(合意度: {issue.get('agreement_score', 0)}%)"
-            for i, issue in enumerate(issues)
-        ])
-        estate_text = "不動産データ: "
-        if estate_data:
-            estate_items = []
-            for k, v in estate_data.items():
-                estate_items.append(f"{k}: {v}")
-            estate_text += ", ".join(estate_items)
-        else:
-            estate_text += "詳細なデータなし"
-        preferences_text = "ユーザー選好: "
-        if user_preferences:
-            pref_items = []
-            for k, v in user_preferences.items():
-                pref_items.append(f"{k}: {v}")
-            preferences_text += ", ".join(pref_items)
-        else:
-            preferences_text += "詳細な選好なし"
-        prompt = f"""
-あなたは遺産相続の専門家AIアシスタントです。以下の論点と情報に基づいて、最適な遺産分割の提案を**絶対に1〜3件だけ**生成し、JSONフォーマットで結果を返してください。
-
-プロジェクトID: {project_id}
-
-論点情報:
-{issues_text}
-
-{estate_text}
-
-{preferences_text}
-
-以下の情報を含む遺産分割の提案を**必ず1〜3件だけ**生成してください。**3件を超えてはいけません。4件以上は絶対に生成しないでください。**
-1. id: 一意の識別子（例："proposal_1"）
-2. title: 提案の短いタイトル
-3. description: 提案の詳細説明
-4. points: 提案のメリット・デメリット等を示すポイントのリスト（各ポイントはtype（merit, demerit, cost, effortなど）とcontentを含む）
-5. support_rate: 想定される支持率（0〜100の整数）
-
-また、最も推奨される提案のIDも特定してください。
-
-**必ずsupport_rate（賛同率）が高い順に並べて返してください。**
-
-レスポンスは必ず以下のJSON形式で返してください（**3件まで。4件以上は絶対にNG**）：
-{{
-  "proposals": [
-    {{
-      "id": "proposal_1",
-      "title": "提案のタイトル",
-      "description": "提案の詳細説明",
-      "points": [
-        {{ "type": "merit", "content": "このプランのメリット" }},
-        {{ "type": "demerit", "content": "このプランのデメリット" }},
-        {{ "type": "cost", "content": "コストに関する考慮点" }},
-        {{ "type": "effort", "content": "必要な手続き" }}
-      ],
-      "support_rate": 支持率（0〜100の整数）
-    }}
-    // 追加する場合も最大2件まで。**絶対に3件を超えないこと！**
-  ],
-  "recommendation": "最も推奨される提案のID"
-}}
+        # 同じ入力の提案生成が実行中の場合は合流して結果を共有する
+        flight_key = make_flight_key(
+            "proposals.generate",
+            request.project_id,
+            {**request.dict(exclude={"async_mode"}), "user_id": user_id}
+        )
 
-遺産相続において公平性と各人の事情を考慮した提案をしてください。特に合意度が低い論点に対して有効な解決策を提示するよう心がけてください。
-説明などは不要です。JSONのみを返してください。
-"""
-        with lock:
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            result_text = response.text.strip()
+        async def generate():
+            # 合流した呼び出し元より長く動く場合があるため、リクエスト単位のセッションではなく専用のセッションを使う
+            flight_db = SessionLocal()
             try:
-                if "```json" in result_text:
-                    json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                elif "```" in result_text:
-                    json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                else:
-                    result = json.loads(result_text)
-                if "proposals" not in result or "recommendation" not in result:
-                    raise ValueError("APIレスポンスに必要なフィールドがありません")
-                # support_rate降順でソートし、最大3件に制限
-                result["proposals"] = sorted(result["proposals"], key=lambda p: p.get("support_rate", 0), reverse=True)[:3]
-                # 生成された提案をDBに保存
-                saved_proposals = []
-                for p in result["proposals"]:
-                    db_proposal = crud.create_proposal(db, schemas.ProposalCreate(
-                        project_id=int(project_id),
-                        title=p["title"],
-                        content=p["description"],
-                        is_favorite=False,
-                        support_rate=p.get("support_rate", 0.0),
-                        user_id=user_id  # 提案を生成したユーザーのIDを設定
-                    ))
-                    # ポイントも保存
-                    for point in p.get("points", []):
-                        crud.create_proposal_point(db, schemas.ProposalPointCreate(
-                            proposal_id=db_proposal.id,
-                            type=point["type"],
-                            content=point["content"]
-                        ))
-                    saved_proposals.append(db_proposal)
-                return JSONResponse(
-                    status_code=status.HTTP_200_OK,
-                    content=result
+                return await generate_and_save_proposals(
+                    flight_db,
+                    project_id=request.project_id,
+                    issues=request.issues,
+                    estate_data=request.estate_data,
+                    user_preferences=request.user_preferences,
+                    user_id=user_id
                 )
-            except json.JSONDecodeError as e:
-                print(f"JSONパースエラー: {e}, テキスト: {result_text}")
-                raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
+            finally:
+                flight_db.close()
+
+        result = await single_flight.do(flight_key, generate)
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content=result
+        )
     except Exception as e:
         print(f"提案生成中にエラーが発生しました: {str(e)}")
         raise HTTPException(
@@ -233,28 +162,25 @@ async def compare_proposals(request: ComparisonRequest):
 
 説明などは不要です。JSONのみを返してください。
 """
-        with lock:
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            result_text = response.text.strip()
-            try:
-                if "```json" in result_text:
-                    json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                elif "```" in result_text:
-                    json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
-                    result = json.loads(json_str)
-                else:
-                    result = json.loads(result_text)
-                if "comparison" not in result or "recommendation" not in result:
-                    raise ValueError("APIレスポンスに必要なフィールドがありません")
-                return JSONResponse(
-                    status_code=status.HTTP_200_OK,
-                    content=result
-                )
-            except json.JSONDecodeError as e:
-                print(f"JSONパースエラー: {e}, テキスト: {result_text}")
-                raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
+        result_text = (await llm_gateway.agenerate(prompt, model_name=GEMINI_MODEL)).strip()
+        try:
+            if "```json" in result_text:
+                json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            elif "```" in result_text:
+                json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
+                result = json.loads(json_str)
+            else:
+                result = json.loads(result_text)
+            if "comparison" not in result or "recommendation" not in result:
+                raise ValueError("APIレスポンスに必要なフィールドがありません")
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content=result
+            )
+        except json.JSONDecodeError as e:
+            print(f"JSONパースエラー: {e}, テキスト: {result_text}")
+            raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
     except Exception as e:
         print(f"提案比較中にエラーが発生しました: {str(e)}")
         raise HTTPException(
@@ -270,9 +196,29 @@ def create_proposal(proposal: schemas.ProposalCreate, db: Session = Depends(get_
     return crud.create_proposal(db=db, proposal=proposal)
 
 @router.get("/", response_model=List[schemas.Proposal], tags=["DB Proposals"])
-def read_proposals(project_id: Optional[int] = None, user_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """提案一覧を取得する（プロジェクトIDとユーザーIDによるフィルタリング可能）"""
-    proposals = crud.get_proposals(db, project_id=project_id, user_id=user_id, skip=skip, limit=limit)
+def read_proposals(
+    response: Response,
+    project_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    提案一覧を取得する（プロジェクトIDとユーザーIDによるフィルタリング可能）
+
+    作成日時順に返し、続きがある場合は X-Next-Cursor ヘッダーのカーソルを cursor に指定して次のページを取得する。
+    """
+    try:
+        after = decode_cursor(cursor, skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 次のページの有無を判定するため1件多く取得する
+    proposals = crud.get_proposals(db, project_id=project_id, user_id=user_id, skip=skip, limit=limit + 1, after=after)
+    proposals, next_cursor = split_page(proposals, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return proposals
 
 @router.get("/{proposal_id}", response_model=schemas.Proposal, tags=["DB Proposals"])
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.db import crud, schemas
 from app.db.session import get_db
+from app.db.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
 
 router = APIRouter()
 
@@ -29,9 +30,27 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """ユーザー一覧を取得する"""
-    users = crud.get_users(db, skip=skip, limit=limit)
+def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    ユーザー一覧を取得する
+
+    作成日時順に返し、続きがある場合は X-Next-Cursor ヘッダーのカーソルを cursor に指定して次のページを取得する。
+    """
+    try:
+        after = decode_cursor(cursor, skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 次のページの有無を判定するため1件多く取得する
+    users = crud.get_users(db, skip=skip, limit=limit + 1, after=after)
+    users, next_cursor = split_page(users, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return users
 
 @router.get("/email/{email}", response_model=schemas.User)
@@ -1,12 +1,42 @@
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator
 import re
 from collections import Counter
 import os
 import google.generativeai as genai
-from app.db import crud  # 追加
+from app.db import crud, schemas  # 追加
+from app.services.keyword_matcher import KeywordMatcher
+from app.services.llm_gateway import llm_gateway
+from app.services.project_context import get_cached_project_summary, set_cached_project_summary
+from app.services.sentiment_lexicon import try_local_sentiment
 from sqlalchemy.orm import Session  # 追加
 
+# 論点生成（トピックごとのLLM呼び出し）の同時実行数とタイムアウト（秒）
+ISSUE_GENERATION_CONCURRENCY = int(os.getenv("ISSUE_GENERATION_CONCURRENCY", "4"))
+ISSUE_GENERATION_TIMEOUT = float(os.getenv("ISSUE_GENERATION_TIMEOUT", "30"))
+# 論点生成モード（per_topic: トピックごとにLLMを呼ぶ / batch: 全トピックを1回のLLM呼び出しで生成）
+ISSUE_GENERATION_MODE = os.getenv("ISSUE_GENERATION_MODE", "per_topic")
+ISSUE_BATCH_GENERATION_TIMEOUT = float(os.getenv("ISSUE_BATCH_GENERATION_TIMEOUT", "60"))
+# 感情分析の一括処理で1回のLLM呼び出しに含めるテキスト数
+SENTIMENT_BATCH_CHUNK_SIZE = int(os.getenv("SENTIMENT_BATCH_CHUNK_SIZE", "20"))
+# AI相談員チャットでそのままプロンプトに含める直近の発言数と、要約を更新するまでに溜める発言数
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "10"))
+CHAT_SUMMARY_MIN_NEW_TURNS = int(os.getenv("CHAT_SUMMARY_MIN_NEW_TURNS", "6"))
+
+# 論点タイプ・合意レベルの日本語表記
+ISSUE_TYPE_JA = {
+    "positive": "肯定的",
+    "negative": "否定的",
+    "neutral": "中立的",
+    "requirement": "要望"
+}
+AGREEMENT_LEVEL_JA = {
+    "high": "高い",
+    "medium": "中程度",
+    "low": "低い"
+}
+
 # Google Generative AIの初期化
 def initialize_google_ai():
     api_key = os.getenv("GEMINI_API_KEY")
@@ -37,18 +67,8 @@ async def generate_issue_content_with_llm(topic: str, topic_sentences: List[str]
         initialize_google_ai()
         
         # 論点タイプと合意レベルを日本語に変換
-        issue_type_ja = {
-            "positive": "肯定的",
-            "negative": "否定的",
-            "neutral": "中立的",
-            "requirement": "要望"
-        }.get(issue_type, "中立的")
-        
-        agreement_level_ja = {
-            "high": "高い",
-            "medium": "中程度",
-            "low": "低い"
-        }.get(agreement_level, "中程度")
+        issue_type_ja = ISSUE_TYPE_JA.get(issue_type, "中立的")
+        agreement_level_ja = AGREEMENT_LEVEL_JA.get(agreement_level, "中程度")
         
         # 会話の要約を作成
         conversation_summary = " ".join(topic_sentences[:10])  # 会話の一部を使用
@@ -79,13 +99,8 @@ async def generate_issue_content_with_llm(topic: str, topic_sentences: List[str]
 特に詳細部分では、合意形成のために何を話し合うべきかを明確にしてください。
 """
         
-        # Google Generative AIを使用
-        model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        
-        # 応答からトピックとサマリーを抽出
-        response_text = response.text
+        # Google Generative AIを使用（LLMゲートウェイ経由）
+        response_text = await llm_gateway.agenerate(prompt, project_id=project_id)
         
         # 見出しと詳細を抽出
         topic_match = re.search(r'見出し[：:](.*?)(?:\n|$)', response_text)
@@ -108,10 +123,138 @@ async def generate_issue_content_with_llm(topic: str, topic_sentences: List[str]
     except Exception as e:
         print(f"LLMによる論点生成エラー: {e}")
         # エラー時はフォールバックとしてシンプルな論点を返す
-        return {
-            "topic": f"{main_keyword}に関する論点",
-            "content": f"この論点については{'意見が分かれており、さらなる話し合いが必要です。' if agreement_level == 'low' else '一定の合意が見られます。'}"
-        }
+        return fallback_issue_content(main_keyword, agreement_level)
+
+def fallback_issue_content(main_keyword: str, agreement_level: str) -> Dict[str, str]:
+    """LLMで論点を生成できなかった場合のシンプルな論点"""
+    return {
+        "topic": f"{main_keyword}に関する論点",
+        "content": f"この論点については{'意見が分かれており、さらなる話し合いが必要です。' if agreement_level == 'low' else '一定の合意が見られます。'}"
+    }
+
+def parse_json_response(response_text: str) -> Any:
+    """LLMの応答テキスト（```json コードブロックを含む場合あり）からJSONを取り出す"""
+    result_text = response_text.strip()
+    if "```json" in result_text:
+        json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
+    elif "```" in result_text:
+        json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
+    else:
+        json_str = result_text
+    return json.loads(json_str)
+
+async def generate_issue_contents_batch_with_llm(candidates: List[Dict[str, Any]], db: Session = None, project_id: int = None) -> Dict[str, Dict[str, str]]:
+    """
+    複数の論点候補の「見出し」と「詳細説明」を1回のLLM呼び出しでまとめて生成する
+
+    参考情報（相続者一覧・遺産一覧）と指示文をトピックごとに繰り返さないため、
+    トピックごとに呼び出す場合よりもトークン数とリクエスト数を削減できる。
+
+    Args:
+        candidates: generate_issue_contents と同じ形式の論点候補リスト
+        db: データベースセッション
+        project_id: プロジェクトID
+
+    Returns:
+        Dict[str, Dict[str, str]]: 候補のtopicをキーとした topic / content の辞書（応答に含まれなかったトピックは含まない）
+    """
+    project_summary = ""
+    if db is not None and project_id is not None:
+        project_summary = build_project_summary_for_prompt(db, project_id)
+
+    topic_blocks = []
+    for candidate in candidates:
+        conversation_summary = " ".join(candidate["topic_sentences"][:10])
+        topic_blocks.append(f"""- key: {candidate["topic"]}
+  キーワード: {candidate["main_keyword"]}
+  意見の傾向: {ISSUE_TYPE_JA.get(candidate["issue_type"], "中立的")}
+  合意度: {AGREEMENT_LEVEL_JA.get(candidate["agreement_level"], "中程度")}
+  関連する会話: {conversation_summary}""")
+    topics_text = "\n".join(topic_blocks)
+
+    prompt = f"""
+{project_summary}
+あなたは相続や実家の処分などについての家族間の話し合いを支援するAIアシスタントです。
+以下の各トピックについて、論点の「見出し」と「詳細説明」を生成してください。
+
+【トピック一覧】
+{topics_text}
+
+各トピックについて、以下の情報を含めてください：
+1. key: トピック一覧のkey（入力と同じ値）
+2. topic: 簡潔で具体的な論点のタイトル
+3. content: この論点の詳細。なぜ議論が必要か、どのような意見の対立や合意があるか、今後どうすれば合意形成できるかなどを含める。150文字程度で簡潔にまとめてください
+
+特に詳細部分では、合意形成のために何を話し合うべきかを明確にしてください。
+
+レスポンスは必ず以下のJSON配列形式で返してください：
+[
+  {{ "key": "トピックのkey", "topic": "論点の見出し", "content": "論点の詳細説明" }}
+]
+
+説明などは不要です。JSONのみを返してください。
+"""
+    response_text = await llm_gateway.agenerate(prompt, project_id=project_id)
+    results = parse_json_response(response_text)
+    if not isinstance(results, list):
+        raise ValueError("APIレスポンスがJSON配列ではありません")
+
+    contents: Dict[str, Dict[str, str]] = {}
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        key = str(item.get("key", "")).strip()
+        generated_topic = str(item.get("topic") or "").strip()
+        generated_content = str(item.get("content") or "").strip()
+        if key and generated_topic and generated_content:
+            contents[key] = {"topic": generated_topic, "content": generated_content}
+    return contents
+
+async def generate_issue_contents(candidates: List[Dict[str, Any]], db: Session = None, project_id: int = None) -> List[Dict[str, str]]:
+    """
+    複数の論点候補について、LLMによる論点生成を並行して実行する
+
+    ISSUE_GENERATION_MODE=batch の場合はまず全候補を1回のLLM呼び出しで生成し、
+    応答に含まれなかった候補のみトピックごとの生成にフォールバックする。
+
+    Args:
+        candidates: generate_issue_content_with_llm の引数（topic, topic_sentences, main_keyword, issue_type, agreement_level）の辞書リスト
+        db: データベースセッション
+        project_id: プロジェクトID
+
+    Returns:
+        List[Dict[str, str]]: candidates と同じ順序の topic / content の辞書リスト
+    """
+    semaphore = asyncio.Semaphore(ISSUE_GENERATION_CONCURRENCY)
+
+    async def _generate(candidate: Dict[str, Any]) -> Dict[str, str]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    generate_issue_content_with_llm(**candidate, db=db, project_id=project_id),
+                    timeout=ISSUE_GENERATION_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                print(f"LLMによる論点生成がタイムアウトしました: {candidate['topic']}")
+                return fallback_issue_content(candidate["main_keyword"], candidate["agreement_level"])
+
+    batch_contents: Dict[str, Dict[str, str]] = {}
+    if ISSUE_GENERATION_MODE == "batch" and candidates:
+        try:
+            batch_contents = await asyncio.wait_for(
+                generate_issue_contents_batch_with_llm(candidates, db=db, project_id=project_id),
+                timeout=ISSUE_BATCH_GENERATION_TIMEOUT
+            )
+        except Exception as e:
+            print(f"LLMによる論点の一括生成エラー（トピックごとの生成にフォールバックします）: {e}")
+
+    async def _resolve(candidate: Dict[str, Any]) -> Dict[str, str]:
+        if candidate["topic"] in batch_contents:
+            return batch_contents[candidate["topic"]]
+        return await _generate(candidate)
+
+    # gatherは引数の順序で結果を返すため、論点の並び順は従来どおり決定的
+    return await asyncio.gather(*[_resolve(candidate) for candidate in candidates])
 
 # 論点タイプを日本語のテキストに変換するヘルパー関数
 def issue_type_text(issue_type: str) -> str:
@@ -124,233 +267,303 @@ def issue_type_text(issue_type: str) -> str:
     else:
         return "議論"
 
-# 論点抽出関数
-async def extract_issues_from_conversations(conversations: List[Any], db: Session = None, project_id: int = None) -> List[Dict[str, Any]]:
+# 論点の種類ごとのキーワード
+POSITIVE_KEYWORDS = ["賛成", "同意", "良い", "いい", "好き", "メリット", "賛同", "住み続け"]
+NEGATIVE_KEYWORDS = ["反対", "同意できない", "悪い", "嫌い", "デメリット", "心配", "不安", "売却"]
+REQUIREMENT_KEYWORDS = ["必要", "要望", "してほしい", "すべき", "べき", "保存", "残す", "思い出"]
+OPINION_KEYWORDS = {
+    "positive": frozenset(POSITIVE_KEYWORDS),
+    "negative": frozenset(NEGATIVE_KEYWORDS),
+    "requirement": frozenset(REQUIREMENT_KEYWORDS),
+}
+
+# 相続に関する主要なトピック
+INHERITANCE_TOPICS = [
+    {"keyword": "実家", "related": ["家", "土地", "不動産", "住む", "住居", "建物"]},
+    {"keyword": "預金", "related": ["貯金", "現金", "口座", "お金", "資産"]},
+    {"keyword": "遺言", "related": ["遺書", "意思", "希望", "要望"]},
+    {"keyword": "分割", "related": ["分ける", "分配", "割合", "配分", "配る"]},
+    {"keyword": "税金", "related": ["相続税", "納税", "税務", "固定資産税"]},
+]
+TOPIC_KEYWORDS = {
+    topic["keyword"]: frozenset([topic["keyword"], *topic["related"]]) for topic in INHERITANCE_TOPICS
+}
+
+# 会話内容に特有の論点（キーワードが会話に含まれていれば追加する）
+EXTRA_ISSUE_CANDIDATES = [
+    {
+        # 賛同率の高い意見
+        "keywords": frozenset(["譲り合い", "話し合い"]),
+        "candidate": {
+            "topic": "話し合い",
+            "topic_sentences": ["家族間での話し合いと譲り合いが重要です", "話し合いで解決しましょう"],
+            "main_keyword": "話し合い",
+            "issue_type": "positive",
+            "agreement_level": "high"
+        },
+    },
+    {
+        # 争点
+        "keywords": frozenset(["争い", "揉め"]),
+        "candidate": {
+            "topic": "争いを避ける",
+            "topic_sentences": ["相続での争いを避けたい", "揉め事は避けたい"],
+            "main_keyword": "争い",
+            "issue_type": "requirement",
+            "agreement_level": "high"
+        },
+    },
+]
+
+# 論点抽出で照合する全キーワードのオートマトン（文ごとに1回の走査ですべての一致を得る）
+ISSUE_KEYWORD_MATCHER = KeywordMatcher(
+    [keyword for keywords in TOPIC_KEYWORDS.values() for keyword in keywords]
+    + [keyword for keywords in OPINION_KEYWORDS.values() for keyword in keywords]
+    + [keyword for extra in EXTRA_ISSUE_CANDIDATES for keyword in extra["keywords"]]
+)
+SENTENCE_SPLIT_PATTERN = re.compile(r'[。.!?！？]')
+# LLMに渡す関連会話の文数（話者ごとに保持する該当文の上限でもある）
+ISSUE_TOPIC_SENTENCE_LIMIT = 10
+
+def collect_topic_evidence(conversations: List[Any], evidence: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
-    会話データから論点を抽出し、合意度を計算する
-    
+    会話をトピックごと・話者ごとに集計する
+
+    各会話を1回だけ文に分割し、文ごとにキーワードオートマトンで1回走査する。
+    処理時間は会話の総量に比例し、トピック数・キーワード数にはほぼ依存しない。
+
     Args:
-        conversations: 会話データのリスト
-        db: データベースセッション
-        project_id: プロジェクトID
-        
+        conversations: 会話データのリスト（時系列順）
+        evidence: 既存の集計結果（指定した場合はそこに追加で集計する）
+
     Returns:
-        抽出された論点のリスト
+        Dict[str, Any]: 以下の集計結果
+            mentioned: 会話全体に含まれていたキーワードの集合
+            speakers: 話者の出現順リスト
+            topics: トピックの主要キーワード -> 話者 -> {"opinions": 意見キーワードの集合, "sentences": 該当文のリスト}
     """
-    # 会話テキストを取得（transcriptからcontentに変更）
-    conversation_texts = [conv.content for conv in conversations]
-    total_text = " ".join(conversation_texts)
-    
-    # スピーカー情報を収集（誰が何を言ったか）
-    speaker_messages: Dict[str, List[str]] = {}
+    if evidence is None:
+        evidence = {"mentioned": set(), "speakers": [], "topics": {}}
     for conv in conversations:
         speaker = conv.speaker or "不明"
-        if speaker not in speaker_messages:
-            speaker_messages[speaker] = []
-        speaker_messages[speaker].append(conv.content)  # transcriptからcontentに変更
-    
-    # 論点の種類ごとのキーワードを定義
-    positive_keywords = ["賛成", "同意", "良い", "いい", "好き", "メリット", "賛同", "住み続け"]
-    negative_keywords = ["反対", "同意できない", "悪い", "嫌い", "デメリット", "心配", "不安", "売却"]
-    requirement_keywords = ["必要", "要望", "してほしい", "すべき", "べき", "保存", "残す", "思い出"]
-    
-    # 抽出された論点リスト
-    extracted_issues: List[Dict[str, Any]] = []
-    
-    # 会話から相続に関する主要なトピックを抽出
-    inheritance_topics = [
-        {"keyword": "実家", "related": ["家", "土地", "不動産", "住む", "住居", "建物"]},
-        {"keyword": "預金", "related": ["貯金", "現金", "口座", "お金", "資産"]},
-        {"keyword": "遺言", "related": ["遺書", "意思", "希望", "要望"]},
-        {"keyword": "分割", "related": ["分ける", "分配", "割合", "配分", "配る"]},
-        {"keyword": "税金", "related": ["相続税", "納税", "税務", "固定資産税"]},
-    ]
+        if speaker not in evidence["speakers"]:
+            evidence["speakers"].append(speaker)
+        for sentence in SENTENCE_SPLIT_PATTERN.split(conv.content or ""):
+            hits = ISSUE_KEYWORD_MATCHER.find_all(sentence)
+            if not hits:
+                continue
+            evidence["mentioned"] |= hits
+            opinion_hits = None
+            for main_keyword, topic_keywords in TOPIC_KEYWORDS.items():
+                if hits.isdisjoint(topic_keywords):
+                    continue
+                if opinion_hits is None:
+                    opinion_hits = {word for word in hits if any(word in words for words in OPINION_KEYWORDS.values())}
+                speaker_evidence = evidence["topics"].setdefault(main_keyword, {}).setdefault(
+                    speaker, {"opinions": set(), "sentences": []}
+                )
+                speaker_evidence["opinions"] |= opinion_hits
+                if len(speaker_evidence["sentences"]) < ISSUE_TOPIC_SENTENCE_LIMIT:
+                    speaker_evidence["sentences"].append(sentence)
+    return evidence
+
+def topic_evidence_to_dict(evidence: Dict[str, Any]) -> Dict[str, Any]:
+    """集計結果をJSONで保存できる形式（集合をソート済みリスト）に変換する"""
+    return {
+        "mentioned": sorted(evidence["mentioned"]),
+        "speakers": list(evidence["speakers"]),
+        "topics": {
+            main_keyword: {
+                speaker: {"opinions": sorted(speaker_evidence["opinions"]), "sentences": list(speaker_evidence["sentences"])}
+                for speaker, speaker_evidence in topic_evidence.items()
+            }
+            for main_keyword, topic_evidence in evidence["topics"].items()
+        }
+    }
+
+def topic_evidence_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """topic_evidence_to_dict で変換した集計結果を元の形式に戻す"""
+    return {
+        "mentioned": set(data.get("mentioned", [])),
+        "speakers": list(data.get("speakers", [])),
+        "topics": {
+            main_keyword: {
+                speaker: {"opinions": set(speaker_evidence["opinions"]), "sentences": list(speaker_evidence["sentences"])}
+                for speaker, speaker_evidence in topic_evidence.items()
+            }
+            for main_keyword, topic_evidence in data.get("topics", {}).items()
+        }
+    }
+
+def classify_topic(speaker_opinions: List[set]) -> Dict[str, str]:
+    """
+    話者ごとの意見キーワードから論点タイプと合意度を決定する
+
+    Args:
+        speaker_opinions: トピックに言及した話者ごとの意見キーワードの集合
+
+    Returns:
+        Dict[str, str]: issue_type と agreement_level
+    """
+    # トピックに関する意見を集計（各話者の最も多い意見タイプを1票とする）
+    opinions = {"positive": 0, "negative": 0, "requirement": 0}
+    for words in speaker_opinions:
+        opinion_counts = [
+            (opinion_type, len(words & keywords)) for opinion_type, keywords in OPINION_KEYWORDS.items()
+        ]
+        max_opinion = max(opinion_counts, key=lambda x: x[1])
+        if max_opinion[1] > 0:
+            opinions[max_opinion[0]] += 1
+    # トピックの種類を決定
+    dominant_opinion = max(opinions.items(), key=lambda x: x[1])
+    if dominant_opinion[1] == 0:
+        # 明確な意見がない場合はneutral
+        issue_type = "neutral"
+    else:
+        issue_type = dominant_opinion[0]
     
-    # 各トピックについて論点を抽出
-    for topic in inheritance_topics:
-        main_keyword = topic["keyword"]
-        related_keywords = topic["related"]
-        
+    # 合意度を計算
+    agreement_counter = {"agree": 0, "disagree": 0}
+    if opinions["positive"] > 0 or opinions["negative"] > 0:
+        dominant_speakers = opinions[dominant_opinion[0]]
+        total_opinion_speakers = opinions["positive"] + opinions["negative"]
+        agreement_counter["agree"] = dominant_speakers
+        agreement_counter["disagree"] = total_opinion_speakers - dominant_speakers
+    total_opinions = agreement_counter["agree"] + agreement_counter["disagree"]
+    if total_opinions > 0:
+        agree_ratio = agreement_counter["agree"] / total_opinions
+        if agree_ratio > 0.7:
+            agreement_level = "high"
+        elif agree_ratio > 0.3:
+            agreement_level = "medium"
+        else:
+            agreement_level = "low"
+    else:
+        agreement_level = "medium"  # デフォルト
+    return {"issue_type": issue_type, "agreement_level": agreement_level}
+
+def build_issue_candidates(evidence: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    collect_topic_evidence の集計結果から論点候補（generate_issue_contents の入力）を作る
+
+    Returns:
+        List[Dict[str, Any]]: topic, topic_sentences, main_keyword, issue_type, agreement_level の辞書リスト
+    """
+    candidates: List[Dict[str, Any]] = []
+    mentioned = evidence["mentioned"]
+    for main_keyword, topic_keywords in TOPIC_KEYWORDS.items():
         # このトピックに関連する発言があるか確認
-        topic_mentioned = str(main_keyword) in total_text
-        if not topic_mentioned:
-            for related in related_keywords:
-                if related in total_text:
-                    topic_mentioned = True
-                    break
-        
-        if topic_mentioned:
-            # トピックに関する意見を集計
-            opinions = {"positive": 0, "negative": 0, "requirement": 0}
-            topic_sentences_all = []
-            # 各話者の発言を分析
-            for speaker, messages in speaker_messages.items():
-                speaker_text = " ".join(messages)
-                # メイントピックまたは関連キーワードを含む文を抽出
-                topic_sentences = []
-                for sentence in re.split(r'[。.!?！？]', speaker_text):
-                    if main_keyword in sentence:
-                        topic_sentences.append(sentence)
-                    else:
-                        for related in related_keywords:
-                            if related in sentence:
-                                topic_sentences.append(sentence)
-                                break
-                topic_text = " ".join(topic_sentences)
-                topic_sentences_all.extend(topic_sentences)
-                # 各カテゴリのキーワード出現回数を数える
-                positive_count = sum([1 for word in positive_keywords if word in topic_text])
-                negative_count = sum([1 for word in negative_keywords if word in topic_text])
-                requirement_count = sum([1 for word in requirement_keywords if word in topic_text])
-                # 最も多い意見タイプを特定
-                opinion_counts = [
-                    ("positive", positive_count),
-                    ("negative", negative_count),
-                    ("requirement", requirement_count)
-                ]
-                max_opinion = max(opinion_counts, key=lambda x: x[1])
-                if max_opinion[1] > 0:
-                    opinions[max_opinion[0]] += 1
-            # トピックの種類を決定
-            opinion_counts = [
-                ("positive", opinions["positive"]),
-                ("negative", opinions["negative"]),
-                ("requirement", opinions["requirement"])
-            ]
-            dominant_opinion = max(opinion_counts, key=lambda x: x[1])
-            if dominant_opinion[1] == 0:
-                # 明確な意見がない場合はneutral
-                issue_type = "neutral"
-            else:
-                issue_type = dominant_opinion[0]
-            
-            # 合意度を計算
-            agreement_counter = {"agree": 0, "disagree": 0}
-            if opinions["positive"] > 0 or opinions["negative"] > 0:
-                dominant_speakers = opinions[dominant_opinion[0]]
-                total_opinion_speakers = opinions["positive"] + opinions["negative"]
-                agreement_counter["agree"] = dominant_speakers
-                agreement_counter["disagree"] = total_opinion_speakers - dominant_speakers
-            total_opinions = agreement_counter["agree"] + agreement_counter["disagree"]
-            if total_opinions > 0:
-                agree_ratio = agreement_counter["agree"] / total_opinions
-                if agree_ratio > 0.7:
-                    agreement_level = "high"
-                elif agree_ratio > 0.3:
-                    agreement_level = "medium"
-                else:
-                    agreement_level = "low"
-            else:
-                agreement_level = "medium"  # デフォルト
-                
-            # LLMを使用して論点内容を生成
-            issue_content = await generate_issue_content_with_llm(
-                topic=str(main_keyword), 
-                topic_sentences=topic_sentences_all, 
-                main_keyword=str(main_keyword),
-                issue_type=issue_type,
-                agreement_level=agreement_level,
-                db=db,
-                project_id=project_id
-            )
-            
-            # 論点を追加
-            # agreement_levelに応じてclassificationを決定
-            if agreement_level == "high":
-                classification = "agreed"
-            elif agreement_level == "medium":
-                classification = "discussing"
-            else:
-                classification = "disagreed"
-            extracted_issues.append({
-                "topic": issue_content["topic"],
-                "content": issue_content["content"],
-                "type": issue_type,
-                "agreement_level": agreement_level,
-                "classification": classification
-            })
+        if mentioned.isdisjoint(topic_keywords):
+            continue
+        topic_evidence = evidence["topics"].get(main_keyword, {})
+        speaker_evidences = [topic_evidence[speaker] for speaker in evidence["speakers"] if speaker in topic_evidence]
+        topic_sentences_all: List[str] = []
+        for speaker_evidence in speaker_evidences:
+            topic_sentences_all.extend(speaker_evidence["sentences"])
+        classified = classify_topic([speaker_evidence["opinions"] for speaker_evidence in speaker_evidences])
+        candidates.append({
+            "topic": main_keyword,
+            "topic_sentences": topic_sentences_all,
+            "main_keyword": main_keyword,
+            **classified
+        })
     
     # カスタム論点の抽出（会話内容に特有の論点）
     # 実際の実装ではAIを使って会話から論点を抽出するべき
+    for extra in EXTRA_ISSUE_CANDIDATES:
+        if not mentioned.isdisjoint(extra["keywords"]):
+            candidates.append(dict(extra["candidate"]))
+    return candidates
+
+def issue_classification(agreement_level: str) -> str:
+    """agreement_levelに応じてclassificationを決定する"""
+    if agreement_level == "high":
+        return "agreed"
+    elif agreement_level == "medium":
+        return "discussing"
+    else:
+        return "disagreed"
+
+async def generate_issues_for_candidates(candidates: List[Dict[str, Any]], db: Session = None, project_id: int = None) -> List[Dict[str, Any]]:
+    """
+    論点候補ごとにLLMで見出しと詳細を生成し、保存用の論点に変換する
+
+    Returns:
+        List[Dict[str, Any]]: candidates と同じ順序の論点リスト（key は候補のtopic）
+    """
+    issue_contents = await generate_issue_contents(candidates, db=db, project_id=project_id)
+    return [
+        {
+            "key": candidate["topic"],
+            "topic": issue_content["topic"],
+            "content": issue_content["content"],
+            "type": candidate["issue_type"],
+            "agreement_level": candidate["agreement_level"],
+            "classification": issue_classification(candidate["agreement_level"])
+        }
+        for candidate, issue_content in zip(candidates, issue_contents)
+    ]
+
+# 抽出された論点が少ない場合に補う論点
+MIN_EXTRACTED_ISSUES = 3
+DEFAULT_ISSUES = [
+    {
+        "topic": "家族の思い出を大切にする方法",
+        "content": "家族の思い出の品やアルバムなどの扱いについて、どのように分配や保存をするかについて話し合う必要があります。全員にとって大切な思い出を残すために、デジタル化や思い出の品の公平な分配方法を検討しましょう。",
+        "type": "positive",
+        "agreement_level": "high",
+        "classification": "agreed"
+    },
+    {
+        "topic": "将来的な資産価値の変動を考慮した判断",
+        "content": "不動産や有価証券などの資産は将来的に価値が変動する可能性があります。現時点での価値だけでなく、将来の価値変動リスクをどのように考慮して分配するかについて、専門家のアドバイスも含めて話し合いましょう。",
+        "type": "neutral",
+        "agreement_level": "medium",
+        "classification": "discussing"
+    },
+    {
+        "topic": "固定資産税などの維持費用の負担",
+        "content": "不動産を相続する場合、固定資産税や修繕費などの維持コストが継続的に発生します。これらの費用をどのように負担するか、特に一部の相続人が不動産を取得する場合の不公平感を解消するための方法について話し合う必要があります。",
+        "type": "negative",
+        "agreement_level": "medium",
+        "classification": "discussing"
+    }
+]
+
+def select_default_issues(extracted_issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """論点が MIN_EXTRACTED_ISSUES 件に満たない場合に追加する既定の論点を返す"""
+    selected: List[Dict[str, Any]] = []
+    for issue in DEFAULT_ISSUES:
+        if len(extracted_issues) + len(selected) >= MIN_EXTRACTED_ISSUES:
+            break
+        # 既に同様の内容がなければ追加
+        if not any(existing["content"] == issue["content"] for existing in extracted_issues):
+            selected.append(dict(issue))
+    return selected
+
+# 論点抽出関数
+async def extract_issues_from_conversations(conversations: List[Any], db: Session = None, project_id: int = None) -> List[Dict[str, Any]]:
+    """
+    会話データから論点を抽出し、合意度を計算する
     
-    # 賛同率の高い意見
-    if "譲り合い" in total_text or "話し合い" in total_text:
-        # LLMを使用して「話し合い」についての論点を生成
-        talking_issue = await generate_issue_content_with_llm(
-            topic="話し合い", 
-            topic_sentences=["家族間での話し合いと譲り合いが重要です", "話し合いで解決しましょう"], 
-            main_keyword="話し合い",
-            issue_type="positive",
-            agreement_level="high",
-            db=db,
-            project_id=project_id
-        )
+    Args:
+        conversations: 会話データのリスト
+        db: データベースセッション
+        project_id: プロジェクトID
         
-        extracted_issues.append({
-            "topic": talking_issue["topic"],
-            "content": talking_issue["content"],
-            "type": "positive",
-            "agreement_level": "high",
-            "classification": "agreed"
-        })
+    Returns:
+        抽出された論点のリスト
+    """
+    # 会話を1回だけ走査して、トピックごと・話者ごとの該当文と意見キーワードを集計
+    evidence = collect_topic_evidence(conversations)
+    # LLMで内容を生成する論点候補（生成は最後にまとめて並行実行する）
+    candidates = build_issue_candidates(evidence)
     
-    # 争点
-    if "争い" in total_text or "揉め" in total_text:
-        # LLMを使用して「争いを避ける」についての論点を生成
-        dispute_issue = await generate_issue_content_with_llm(
-            topic="争いを避ける", 
-            topic_sentences=["相続での争いを避けたい", "揉め事は避けたい"], 
-            main_keyword="争い",
-            issue_type="requirement",
-            agreement_level="high",
-            db=db,
-            project_id=project_id
-        )
-        
-        extracted_issues.append({
-            "topic": dispute_issue["topic"],
-            "content": dispute_issue["content"],
-            "type": "requirement",
-            "agreement_level": "high",
-            "classification": "agreed"
-        })
+    # LLMを使用して論点内容を並行して生成
+    extracted_issues = await generate_issues_for_candidates(candidates, db=db, project_id=project_id)
     
     # 少なくとも3つの論点があるように調整
-    if len(extracted_issues) < 3:
-        default_issues = [
-            {
-                "topic": "家族の思い出を大切にする方法",
-                "content": "家族の思い出の品やアルバムなどの扱いについて、どのように分配や保存をするかについて話し合う必要があります。全員にとって大切な思い出を残すために、デジタル化や思い出の品の公平な分配方法を検討しましょう。",
-                "type": "positive",
-                "agreement_level": "high",
-                "classification": "agreed"
-            },
-            {
-                "topic": "将来的な資産価値の変動を考慮した判断",
-                "content": "不動産や有価証券などの資産は将来的に価値が変動する可能性があります。現時点での価値だけでなく、将来の価値変動リスクをどのように考慮して分配するかについて、専門家のアドバイスも含めて話し合いましょう。",
-                "type": "neutral",
-                "agreement_level": "medium",
-                "classification": "discussing"
-            },
-            {
-                "topic": "固定資産税などの維持費用の負担",
-                "content": "不動産を相続する場合、固定資産税や修繕費などの維持コストが継続的に発生します。これらの費用をどのように負担するか、特に一部の相続人が不動産を取得する場合の不公平感を解消するための方法について話し合う必要があります。",
-                "type": "negative", 
-                "agreement_level": "medium",
-                "classification": "discussing"
-            }
-        ]
-        
-        # 不足分の論点を追加
-        for issue in default_issues:
-            if len(extracted_issues) >= 3:
-                break
-                
-            # 既に同様の内容がなければ追加
-            if not any(existing["content"] == issue["content"] for existing in extracted_issues):
-                extracted_issues.append(issue)
-    
-    return extracted_issues
+    return extracted_issues + select_default_issues(extracted_issues)
 
 def generate_agreement_content_with_llm(project_title: str, proposal_content: str, db: Session = None, project_id: int = None) -> dict:
     """
@@ -392,10 +605,7 @@ def generate_agreement_content_with_llm(project_title: str, proposal_content: st
 - 参加者全員が合意したことを明記すること
 - 必要十分な内容を含めるが、A4で10ページを超えるような長文にはしないこと（通常は1〜2ページ程度を想定）
 """
-        model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+        text = llm_gateway.generate(prompt, project_id=project_id).strip()
         text = text.replace('```', '').strip()
         # 1行目をタイトル、それ以降を本文とする
         lines = text.splitlines()
@@ -410,10 +620,146 @@ def generate_agreement_content_with_llm(project_title: str, proposal_content: st
         print(f"Gemini協議書生成エラー: {e}")
         return {"title": "遺産分割協議書", "content": f"{project_title}に関する協議の結果、以下の内容で合意しました。\n{proposal_content}\n\n本協議書の内容に全員が合意し、署名します。"}
 
+def create_agreement_with_llm(db: Session, project_id: int, proposal_id: int):
+    """
+    提案をもとにLLMで協議書を生成して保存する
+
+    Returns:
+        作成した協議書（提案が見つからない場合はNone）
+    """
+    proposal = crud.get_proposal(db, proposal_id=proposal_id)
+    if not proposal:
+        return None
+    # Gemini LLMで協議書タイトルと本文を生成
+    agreement_result = generate_agreement_content_with_llm(
+        project_title=proposal.title,
+        proposal_content=proposal.content,
+        db=db,
+        project_id=project_id
+    )
+    agreement_in = schemas.AgreementCreate(
+        project_id=project_id,
+        proposal_id=proposal_id,
+        title=agreement_result["title"],
+        content=agreement_result["content"],
+        status="draft",
+        is_signed=False
+    )
+    return crud.create_agreement(db, agreement_in)
+
+def sentiment_label(sentiment_score: float, is_positive: bool) -> str:
+    """感情スコアを会話に保存する感情ラベル（positive / neutral / negative）に変換する"""
+    if is_positive:
+        return "positive"
+    if sentiment_score < 0.4:
+        return "negative"
+    return "neutral"
+
+async def analyze_sentiment_chunk_with_llm(texts: List[str], context: str, project_id: int | None = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    複数のテキストの感情を1回のLLM呼び出しで分析する
+
+    Returns:
+        List[Optional[Dict[str, Any]]]: texts と同じ順序の分析結果（応答に含まれなかったテキストはNone）
+    """
+    texts_text = "\n".join([f"{i}: {text}" for i, text in enumerate(texts)])
+    prompt = f"""
+あなたは感情分析AIアシスタントです。以下の番号付きテキストそれぞれの感情を分析し、JSONフォーマットで結果を返してください。
+
+コンテキスト: {context}
+テキスト一覧:
+{texts_text}
+
+各テキストについて、以下の情報を返してください：
+1. index: テキストの番号（入力と同じ値）
+2. sentiment_score: 0.0（非常にネガティブ）から1.0（非常にポジティブ）までの数値
+3. is_positive: trueまたはfalseのブール値（0.5より大きければtrue）
+4. keywords: 抽出された感情キーワードのリスト（各キーワードの種類（positiveまたはnegative）も含める）
+
+レスポンスは必ず以下のJSON配列形式で、すべてのテキストについて返してください：
+[
+  {{
+    "index": 0,
+    "sentiment_score": 数値（0.0〜1.0）,
+    "is_positive": ブール値（trueまたはfalse）,
+    "keywords": [
+      {{ "word": "キーワード1", "type": "positive" }}
+    ]
+  }}
+]
+
+説明などは不要です。JSONのみを返してください。
+"""
+    response_text = await llm_gateway.agenerate(prompt, project_id=project_id)
+    items = parse_json_response(response_text)
+    if not isinstance(items, list):
+        raise ValueError("APIレスポンスがJSON配列ではありません")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item["index"])
+            score = float(item["sentiment_score"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(texts):
+            is_positive = bool(item.get("is_positive", score > 0.5))
+            results[index] = {
+                "sentiment_score": score,
+                "is_positive": is_positive,
+                "keywords": item.get("keywords") or [],
+                "sentiment": sentiment_label(score, is_positive),
+                "source": "llm"
+            }
+    return results
+
+async def analyze_sentiments_batch(texts: List[str], context: str = "遺産相続に関する会話", project_id: int | None = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    多数のテキストの感情を SENTIMENT_BATCH_CHUNK_SIZE 件ずつまとめて分析する
+
+    辞書ベースのローカル判定で十分な信頼度が得られたテキストはLLMに送らない。
+    残りのチャンクは並行してLLMゲートウェイに送られ、失敗したチャンクのテキストはNoneになる。
+
+    Returns:
+        List[Optional[Dict[str, Any]]]: texts と同じ順序の分析結果
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    escalated_indexes: List[int] = []
+    for i, text in enumerate(texts):
+        local_result = try_local_sentiment(text)
+        if local_result is not None:
+            results[i] = {**local_result, "sentiment": sentiment_label(local_result["sentiment_score"], local_result["is_positive"])}
+        else:
+            escalated_indexes.append(i)
+
+    escalated_texts = [texts[i] for i in escalated_indexes]
+    chunks = [escalated_texts[i:i + SENTIMENT_BATCH_CHUNK_SIZE] for i in range(0, len(escalated_texts), SENTIMENT_BATCH_CHUNK_SIZE)]
+
+    async def _analyze(chunk: List[str]) -> List[Optional[Dict[str, Any]]]:
+        try:
+            return await analyze_sentiment_chunk_with_llm(chunk, context, project_id)
+        except Exception as e:
+            print(f"感情分析（一括）エラー: {e}")
+            return [None] * len(chunk)
+
+    chunk_results = await asyncio.gather(*[_analyze(chunk) for chunk in chunks])
+    llm_results = [result for chunk_result in chunk_results for result in chunk_result]
+    for i, llm_result in zip(escalated_indexes, llm_results):
+        results[i] = llm_result
+    return results
+
 def build_project_summary_for_prompt(db: Session, project_id: int) -> str:
     """
     指定プロジェクトの相続者一覧・遺産一覧をプロンプト用に整形して返す
+
+    相続者・遺産が更新されるまではキャッシュした結果を返す（LLM呼び出しごとにDBを参照しない）
     """
+    cached_summary = get_cached_project_summary(project_id)
+    if cached_summary is not None:
+        return cached_summary
+
     # 相続者一覧
     members = crud.get_project_members(db, project_id)
     member_lines = []
@@ -443,16 +789,77 @@ def build_project_summary_for_prompt(db: Session, project_id: int) -> str:
     estate_str = "\n".join(estate_lines) if estate_lines else "（登録なし）"
 
     summary = f"""【参考情報】\n相続者一覧:\n{member_str}\n\n遺産一覧:\n{estate_str}\n"""
+    set_cached_project_summary(project_id, summary)
     return summary
 
-def generate_ai_chat_reply(messages: list[dict], user_message: str, project_id: int | None = None, user_id: int | None = None, db: Session | None = None) -> dict:
-    """
-    AI相談員として会話履歴とユーザー発言をもとに専門的な返答を生成し、project_id, user_idも返す
-    """
-    initialize_google_ai()
-    history_text = "\n".join([
+def format_chat_history(messages: list[dict]) -> str:
+    return "\n".join([
         f"{m.get('speaker', 'ユーザー')}: {m.get('content', '')}" for m in messages
     ])
+
+async def summarize_chat_history(previous_summary: str, messages: list[dict], project_id: int | None = None) -> str:
+    """
+    これまでの要約に新しい発言を取り込み、更新した要約を返す
+    """
+    prompt = f"""
+あなたは遺産相続に関する家族の相談内容を記録するAIアシスタントです。
+以下の「これまでの要約」に「新しい発言」の内容を取り込み、更新した要約を作成してください。
+
+【これまでの要約】
+{previous_summary or "（なし）"}
+
+【新しい発言】
+{format_chat_history(messages)}
+
+【出力ルール】
+- 相続人・財産・各人の希望や懸念・合意済みの事項・未解決の論点など、今後の相談に必要な事実を残すこと
+- あいさつや重複する内容は省くこと
+- 400文字以内の日本語の文章で出力し、要約以外の説明は出力しないこと
+"""
+    summary = await llm_gateway.agenerate(prompt, project_id=project_id)
+    return summary.strip()
+
+async def compact_chat_history(messages: list[dict], project_id: int | None = None, user_id: int | None = None, db: Session | None = None) -> tuple[str, list[dict]]:
+    """
+    会話履歴を「古い発言の要約」と「そのままプロンプトに含める直近の発言」に分ける
+
+    要約はプロジェクト・ユーザーごとにDBへ保存し、新しい発言が CHAT_SUMMARY_MIN_NEW_TURNS 件
+    溜まるごとに差分だけを要約に取り込む。これにより会話が長くなってもプロンプトの長さはほぼ一定になる。
+
+    Returns:
+        tuple[str, list[dict]]: (古い発言の要約, 直近の発言リスト)
+    """
+    if len(messages) <= CHAT_HISTORY_KEEP_TURNS:
+        return "", messages
+    if db is None or project_id is None:
+        # 要約を保存できない場合は直近の発言のみを使う
+        return "", messages[-CHAT_HISTORY_KEEP_TURNS:]
+
+    stored = crud.get_chat_history_summary(db, project_id, user_id)
+    summary = stored.summary if stored else ""
+    summarized_count = stored.summarized_count if stored else 0
+    if summarized_count > len(messages):
+        # 会話履歴が保存時より短い（履歴がリセットされた）場合は作り直す
+        summary, summarized_count = "", 0
+
+    older_count = len(messages) - CHAT_HISTORY_KEEP_TURNS
+    if older_count - summarized_count >= CHAT_SUMMARY_MIN_NEW_TURNS:
+        try:
+            summary = await summarize_chat_history(summary, messages[summarized_count:older_count], project_id)
+            summarized_count = older_count
+            crud.save_chat_history_summary(db, project_id, user_id, summary, summarized_count)
+        except Exception as e:
+            # 要約に失敗した場合は前回の要約のまま続行し、次の発言で再試行する
+            print(f"会話履歴の要約エラー: {e}")
+    return summary, messages[summarized_count:]
+
+def build_ai_chat_prompt(messages: list[dict], user_message: str, project_id: int | None = None, db: Session | None = None, history_summary: str = "") -> str:
+    """
+    AI相談員の返答生成用プロンプトを組み立てる
+    """
+    history_text = format_chat_history(messages)
+    if history_summary:
+        history_text = f"（これまでの会話の要約）\n{history_summary}\n\n（直近の会話）\n{history_text}"
     # 相続者一覧・遺産一覧を付加
     project_summary = ""
     if db is not None and project_id is not None:
@@ -495,11 +902,29 @@ def generate_ai_chat_reply(messages: list[dict], user_message: str, project_id:
 ---
 これらを参考に、ユーザーの状況や会話の流れに合わせて、適切な質問や共感、専門的なアドバイスを返してください。
 """
-    model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
+    return prompt
+
+async def generate_ai_chat_reply(messages: list[dict], user_message: str, project_id: int | None = None, user_id: int | None = None, db: Session | None = None) -> dict:
+    """
+    AI相談員として会話履歴とユーザー発言をもとに専門的な返答を生成し、project_id, user_idも返す
+    """
+    initialize_google_ai()
+    history_summary, recent_messages = await compact_chat_history(messages, project_id, user_id, db)
+    prompt = build_ai_chat_prompt(recent_messages, user_message, project_id, db, history_summary)
+    # 会話の応答は毎回生成する（キャッシュしない）
+    reply = await llm_gateway.agenerate(prompt, project_id=project_id, use_cache=False)
     return {
-        "reply": response.text.strip(),
+        "reply": reply.strip(),
         "project_id": project_id,
         "user_id": user_id
     }
+
+async def stream_ai_chat_reply(messages: list[dict], user_message: str, project_id: int | None = None, user_id: int | None = None, db: Session | None = None) -> AsyncIterator[str]:
+    """
+    AI相談員の返答を生成し、届いたテキストから順に返す（SSE配信用）
+    """
+    initialize_google_ai()
+    history_summary, recent_messages = await compact_chat_history(messages, project_id, user_id, db)
+    prompt = build_ai_chat_prompt(recent_messages, user_message, project_id, db, history_summary)
+    async for chunk in llm_gateway.astream(prompt, project_id=project_id):
+        yield chunk
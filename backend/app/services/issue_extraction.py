@@ -0,0 +1,206 @@
+import os
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db import crud, schemas
+from app.services.ai_service import (
+    MIN_EXTRACTED_ISSUES,
+    build_issue_candidates,
+    collect_topic_evidence,
+    generate_issues_for_candidates,
+    select_default_issues,
+    topic_evidence_from_dict,
+    topic_evidence_to_dict,
+)
+
+# 差分抽出で、前回処理した最新の会話の作成日時からさかのぼって取得し直す秒数
+# （IDの小さい会話が後からコミットされた場合も取りこぼさないようにする。重なった会話はIDで除く）
+ISSUE_EXTRACTION_OVERLAP_SECONDS = int(os.getenv("ISSUE_EXTRACTION_OVERLAP_SECONDS", "600"))
+
+
+def _issue_base(issue: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "topic": issue.get("topic"),
+        "content": issue["content"],
+        "type": issue["type"],
+        "agreement_level": issue.get("agreement_level"),
+        "classification": issue["classification"],
+    }
+
+
+def _recent_conversations(recent: List[List[Any]], conversations: List[Any]) -> List[List[Any]]:
+    """
+    処理済みの会話のうち、重ねて取得し直す期間に入るものの [ID, 作成日時] を返す
+
+    recent は前回までの [ID, 作成日時（ISO形式）] のリスト。
+    """
+    merged = {conv_id: datetime.fromisoformat(created_at) for conv_id, created_at in recent}
+    for conv in conversations:
+        if conv.created_at is not None:
+            merged[conv.id] = conv.created_at
+    if not merged:
+        return []
+    since = max(merged.values()) - timedelta(seconds=ISSUE_EXTRACTION_OVERLAP_SECONDS)
+    return [
+        [conv_id, created_at.isoformat()]
+        for conv_id, created_at in sorted(merged.items())
+        if created_at >= since
+    ]
+
+
+def _save_state(
+    db: Session,
+    project_id: int,
+    user_id: Optional[int],
+    last_conversation_id: int,
+    evidence: Dict[str, Any],
+    snapshots: Dict[str, Dict[str, Any]],
+    default_issue_ids: List[int],
+    recent_conversations: List[List[Any]],
+) -> None:
+    state = {
+        "evidence": topic_evidence_to_dict(evidence),
+        # 候補のtopic -> 保存した論点のIDと、生成時の論点タイプ・合意度
+        "issues": snapshots,
+        # 論点が少ない場合に補った既定の論点のID
+        "default_issue_ids": default_issue_ids,
+        # 次回の差分抽出で重ねて取得する期間の処理済みの会話（[ID, 作成日時]）
+        "recent_conversations": recent_conversations,
+    }
+    crud.save_issue_extraction_state(
+        db, project_id, user_id, last_conversation_id, json.dumps(state, ensure_ascii=False)
+    )
+
+
+def _ordered_issues(db: Session, project_id: int, user_id: Optional[int], issue_ids: List[int]) -> List[schemas.Issue]:
+    rows = {issue.id: issue for issue in crud.get_issues(db, project_id=project_id, user_id=user_id, limit=None)}
+    return [schemas.Issue.model_validate(rows[issue_id]) for issue_id in issue_ids if issue_id in rows]
+
+
+async def extract_issues_full(db: Session, project_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """既存の論点を、会話全体から抽出し直した論点に置き換える（集計状態も作り直す）"""
+    # 会話データを取得（件数で打ち切らず全件）
+    conversations = crud.get_conversations_ordered_by_timestamp(db, project_id=project_id, user_id=user_id, limit=None)
+    evidence = collect_topic_evidence(conversations)
+    last_conversation_id = max((conv.id for conv in conversations), default=0)
+
+    # 会話データがない場合
+    if not conversations:
+        crud.replace_project_issues(db, project_id, user_id, [])
+        _save_state(db, project_id, user_id, last_conversation_id, evidence, {}, [], [])
+        return {"message": "会話データがありません", "issues": []}
+
+    # 会話から論点を抽出（AIサービスを使用）
+    candidates = build_issue_candidates(evidence)
+    extracted_issues = await generate_issues_for_candidates(candidates, db=db, project_id=project_id)
+    # 少なくとも3つの論点があるように調整
+    default_issues = select_default_issues(extracted_issues)
+
+    # 既存の論点の削除と抽出した論点の保存を1つのトランザクションで行う（生成に失敗した場合は元の論点が残る）
+    rows = crud.replace_project_issues(db, project_id, user_id, [
+        schemas.IssueCreate(project_id=project_id, user_id=user_id, **_issue_base(issue))
+        for issue in extracted_issues + default_issues
+    ])
+    snapshots: Dict[str, Dict[str, Any]] = {
+        issue["key"]: {"issue_id": row.id, "issue_type": issue["type"], "agreement_level": issue["agreement_level"]}
+        for issue, row in zip(extracted_issues, rows)
+    }
+    default_issue_ids = [row.id for row in rows[len(extracted_issues):]]
+
+    _save_state(
+        db, project_id, user_id, last_conversation_id, evidence, snapshots, default_issue_ids,
+        _recent_conversations([], conversations)
+    )
+    saved_issues = [schemas.Issue.model_validate(row) for row in rows]
+    return {
+        "message": f"{len(saved_issues)}件の論点を抽出しました",
+        "issues": saved_issues
+    }
+
+
+async def extract_issues_incrementally(db: Session, project_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    前回の抽出以降に追加された会話だけを集計に加え、変化した論点のみ更新する
+
+    論点タイプ・合意度が変わった論点（と新たに言及されたトピック）だけをLLMで生成し直すため、
+    処理量は追加された会話の量に比例する。集計状態がない場合は全体を抽出する。
+    """
+    db_state = crud.get_issue_extraction_state(db, project_id, user_id)
+    if db_state is None:
+        return await extract_issues_full(db, project_id, user_id)
+
+    state = json.loads(db_state.state)
+    snapshots: Dict[str, Dict[str, Any]] = state.get("issues", {})
+    default_issue_ids: List[int] = state.get("default_issue_ids", [])
+
+    # 前回の最大IDより後の会話に加え、重ねて取得する期間の会話も取得し、処理済みのものはIDで除く
+    recent: List[List[Any]] = state.get("recent_conversations", [])
+    processed_ids = {conv_id for conv_id, _ in recent}
+    since = None
+    if recent:
+        since = max(datetime.fromisoformat(created_at) for _, created_at in recent) - timedelta(seconds=ISSUE_EXTRACTION_OVERLAP_SECONDS)
+    new_conversations = [
+        conv for conv in crud.get_conversations_after(db, project_id, user_id, db_state.last_conversation_id, since=since)
+        if conv.id not in processed_ids
+    ]
+    if not new_conversations:
+        tracked_ids = [snapshot["issue_id"] for snapshot in snapshots.values()] + default_issue_ids
+        return {
+            "message": "新しい会話はありません",
+            "issues": _ordered_issues(db, project_id, user_id, tracked_ids)
+        }
+
+    # 新しい会話だけを既存の集計に加える
+    evidence = collect_topic_evidence(new_conversations, topic_evidence_from_dict(state.get("evidence", {})))
+    candidates = build_issue_candidates(evidence)
+
+    # 論点タイプ・合意度が変わった候補と、論点が未保存（または削除済み）の候補だけを生成し直す
+    existing_ids = {issue.id for issue in crud.get_issues(db, project_id=project_id, user_id=user_id, limit=None)}
+    changed_candidates = []
+    for candidate in candidates:
+        snapshot = snapshots.get(candidate["topic"])
+        if (
+            snapshot is None
+            or snapshot["issue_id"] not in existing_ids
+            or snapshot["issue_type"] != candidate["issue_type"]
+            or snapshot["agreement_level"] != candidate["agreement_level"]
+        ):
+            changed_candidates.append(candidate)
+    updated_issues = await generate_issues_for_candidates(changed_candidates, db=db, project_id=project_id)
+
+    for issue in updated_issues:
+        snapshot = snapshots.get(issue["key"])
+        if snapshot is not None and snapshot["issue_id"] in existing_ids:
+            db_issue = crud.update_issue(db, issue_id=snapshot["issue_id"], issue_data=schemas.IssueBase(**_issue_base(issue)))
+        else:
+            db_issue = crud.create_issue(db=db, issue=schemas.IssueCreate(project_id=project_id, user_id=user_id, **_issue_base(issue)))
+        snapshots[issue["key"]] = {"issue_id": db_issue.id, "issue_type": issue["type"], "agreement_level": issue["agreement_level"]}
+
+    # 論点が増えて不要になった既定の論点を削除（削除済みのものは対象外）
+    default_issue_ids = [issue_id for issue_id in default_issue_ids if issue_id in existing_ids]
+    keep_defaults = max(0, MIN_EXTRACTED_ISSUES - len(candidates))
+    if len(default_issue_ids) > keep_defaults:
+        crud.delete_issues(db, default_issue_ids[keep_defaults:])
+        default_issue_ids = default_issue_ids[:keep_defaults]
+
+    last_conversation_id = max(db_state.last_conversation_id, max(conv.id for conv in new_conversations))
+    _save_state(
+        db, project_id, user_id, last_conversation_id, evidence, snapshots, default_issue_ids,
+        _recent_conversations(recent, new_conversations)
+    )
+
+    issue_ids = [snapshots[candidate["topic"]]["issue_id"] for candidate in candidates] + default_issue_ids
+    return {
+        "message": f"新しい会話{len(new_conversations)}件から{len(updated_issues)}件の論点を更新しました",
+        "issues": _ordered_issues(db, project_id, user_id, issue_ids)
+    }
+
+
+async def extract_project_issues(db: Session, project_id: int, user_id: Optional[int] = None, mode: str = "full") -> Dict[str, Any]:
+    """会話から論点を抽出して保存する（mode: "full" または "incremental"）"""
+    if mode == "incremental":
+        return await extract_issues_incrementally(db, project_id, user_id)
+    return await extract_issues_full(db, project_id, user_id)
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.db import crud, models, schemas
+from app.db.session import SessionLocal
+from app.services.ai_service import create_agreement_with_llm
+from app.services.issue_extraction import extract_project_issues
+from app.services.proposal_service import generate_and_save_proposals
+
+logger = logging.getLogger(__name__)
+
+# ワーカーの設定
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+# 実行中のジョブのハートビート（heartbeat_at の更新）の間隔（秒）
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# ハートビートが途絶えたジョブを停止したワーカーのものとみなすまでの秒数
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# 停止したワーカーのジョブを回収する間隔（秒）
+_STALE_CHECK_INTERVAL_SECONDS = 60
+
+JobHandler = Callable[[Session, Dict[str, Any]], Awaitable[Any]]
+
+
+# ===== ジョブの種類ごとの処理 =====
+
+async def _extract_issues_job(db: Session, payload: Dict[str, Any]) -> Any:
+    return await extract_project_issues(
+        db,
+        project_id=payload["project_id"],
+        user_id=payload.get("user_id"),
+        mode=payload.get("mode", "full"),
+    )
+
+
+async def _generate_proposals_job(db: Session, payload: Dict[str, Any]) -> Any:
+    return await generate_and_save_proposals(
+        db,
+        project_id=payload["project_id"],
+        issues=payload.get("issues", []),
+        estate_data=payload.get("estate_data"),
+        user_preferences=payload.get("user_preferences"),
+        user_id=payload.get("user_id"),
+    )
+
+
+async def _generate_agreement_job(db: Session, payload: Dict[str, Any]) -> Any:
+    agreement = create_agreement_with_llm(db, project_id=payload["project_id"], proposal_id=payload["proposal_id"])
+    if agreement is None:
+        raise LookupError("Proposal not found")
+    return schemas.Agreement.model_validate(agreement)
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    "issues.extract": _extract_issues_job,
+    "proposals.generate": _generate_proposals_job,
+    "agreements.generate": _generate_agreement_job,
+}
+
+
+# ジョブの種類ごとの入力のスキーマ
+JOB_PAYLOAD_SCHEMAS = {
+    "issues.extract": schemas.IssuesExtractJobPayload,
+    "proposals.generate": schemas.ProposalsGenerateJobPayload,
+    "agreements.generate": schemas.AgreementsGenerateJobPayload,
+}
+
+
+# ===== 投入・実行 =====
+
+def validate_job_payload(job_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """ジョブの種別と入力を検証し、スキーマの形に揃えた入力を返す（不正な場合は ValueError）"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"未対応のジョブ種別です（対応: {', '.join(JOB_HANDLERS)}）")
+    try:
+        return JOB_PAYLOAD_SCHEMAS[job_type].model_validate(payload).model_dump()
+    except ValidationError as e:
+        raise ValueError(f"ジョブの入力が正しくありません（{job_type}）: {e}")
+
+
+def submit_job(
+    db: Session,
+    job_type: str,
+    payload: Dict[str, Any],
+    project_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> models.Job:
+    """
+    ジョブを登録し、プロセス内のワーカーを起こす
+
+    同じ種別・同じ入力のジョブが待機中または実行中の場合は、新たに登録せずそのジョブを返す。
+    """
+    payload = validate_job_payload(job_type, payload)
+    # キー順を揃えて、同じ入力が同じ文字列になるようにする
+    payload_json = json.dumps(jsonable_encoder(payload), ensure_ascii=False, sort_keys=True)
+    db_job = crud.get_active_job(db, job_type=job_type, payload=payload_json)
+    if db_job is not None:
+        return db_job
+    db_job = crud.create_job(
+        db,
+        job_type=job_type,
+        payload=payload_json,
+        project_id=project_id,
+        user_id=user_id,
+    )
+    job_worker.notify()
+    return db_job
+
+
+def job_accepted_response(db_job: models.Job) -> JSONResponse:
+    """非同期モードで受け付けたジョブの情報を 202 Accepted で返す"""
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=jsonable_encoder(schemas.JobStatus.model_validate(db_job)),
+    )
+
+
+def load_job_result(db_job: models.Job) -> Any:
+    return json.loads(db_job.result) if db_job.result else None
+
+
+def _send_heartbeats(job_id: int, attempt: int, done: threading.Event) -> None:
+    """
+    ジョブの実行中、JOB_HEARTBEAT_SECONDS ごとに heartbeat_at を更新する
+
+    ジョブの処理が同期的なLLM呼び出しでイベントループを止めていても更新できるよう、別スレッドで動かす。
+    """
+    while not done.wait(JOB_HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            if not crud.heartbeat_job(db, job_id, attempt):
+                logger.warning(f"ジョブが再投入されたため、ハートビートを停止します: id={job_id}, attempt={attempt}")
+                return
+        except Exception as e:
+            logger.warning(f"ジョブのハートビートの更新に失敗しました: id={job_id}, {e}")
+        finally:
+            db.close()
+
+
+async def run_job(job_id: int, job_type: str, payload: str, attempt: int) -> None:
+    """ジョブを実行し、結果（または失敗理由）を保存する"""
+    done = threading.Event()
+    threading.Thread(
+        target=_send_heartbeats, args=(job_id, attempt, done), name=f"job-heartbeat-{job_id}", daemon=True
+    ).start()
+    db = SessionLocal()
+    try:
+        try:
+            result = await JOB_HANDLERS[job_type](db, json.loads(payload))
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"ジョブの実行に失敗しました: id={job_id}, type={job_type}")
+            saved = crud.finish_job(db, job_id, attempt, error=str(e) or e.__class__.__name__)
+        else:
+            saved = crud.finish_job(db, job_id, attempt, result=json.dumps(jsonable_encoder(result), ensure_ascii=False))
+        if not saved:
+            logger.warning(f"ジョブが再投入されていたため、結果を保存しませんでした: id={job_id}, attempt={attempt}")
+    finally:
+        done.set()
+        db.close()
+
+
+class JobWorker:
+    """
+    jobs テーブルをキューとして使うワーカー
+
+    - 各スレッドが待機中のジョブを FOR UPDATE SKIP LOCKED で1件ずつ取り出して実行する
+      （Postgresだけで動き、別プロセス・別インスタンスのワーカーと同時に動かしても重複実行しない）
+    - APIサーバー内で start() するか、`python -m app.worker` で単独のプロセスとして起動する
+    - 実行中のジョブはハートビートを送り、JOB_STALE_SECONDS の間途絶えたものを停止したワーカーのものとみなして再投入する
+      （再投入前の試行が後から終わっても、結果は保存しない）
+    """
+
+    def __init__(
+        self,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        poll_interval: float = JOB_POLL_INTERVAL_SECONDS,
+        job_types: Optional[List[str]] = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.job_types = job_types
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_stale_check = 0.0
+        self._stale_lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"ジョブワーカーを起動しました (スレッド数: {self.concurrency})")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """新しいジョブの取り出しをやめ、実行中のジョブの完了を待つ"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """ジョブが登録されたことを知らせ、ポーリング間隔を待たずに取り出させる"""
+        self._wakeup.set()
+
+    def run_forever(self) -> None:
+        """ワーカーを起動し、Ctrl+C などで中断されるまでブロックする"""
+        self.start()
+        try:
+            while not self._stopping.is_set():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _requeue_stale_jobs(self) -> None:
+        with self._stale_lock:
+            now = time.monotonic()
+            if now - self._last_stale_check < _STALE_CHECK_INTERVAL_SECONDS:
+                return
+            self._last_stale_check = now
+        db = SessionLocal()
+        try:
+            stale_before = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)
+            count = crud.requeue_stale_jobs(db, stale_before, JOB_MAX_ATTEMPTS)
+            if count:
+                logger.warning(f"停止したワーカーのジョブを{count}件回収しました")
+        except Exception as e:
+            logger.warning(f"停止したワーカーのジョブの回収に失敗しました: {e}")
+        finally:
+            db.close()
+
+    def _claim(self) -> Optional[models.Job]:
+        db = SessionLocal()
+        try:
+            return crud.claim_next_job(db, job_types=self.job_types)
+        except Exception as e:
+            logger.warning(f"ジョブの取り出しに失敗しました: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        # スレッドごとにイベントループを持ち、非同期のジョブ処理を実行する
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while not self._stopping.is_set():
+                self._requeue_stale_jobs()
+                db_job = self._claim()
+                if db_job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                loop.run_until_complete(run_job(db_job.id, db_job.job_type, db_job.payload, db_job.attempts))
+        finally:
+            loop.close()
+
+
+# プロセス全体で共有するワーカー
+job_worker = JobWorker()
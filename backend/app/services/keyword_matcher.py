@@ -0,0 +1,60 @@
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Set
+
+
+class KeywordMatcher:
+    """
+    Aho–Corasick法による複数キーワードの一括照合
+
+    事前に全キーワードからオートマトンを構築しておき、テキストを1回走査するだけで
+    含まれるすべてのキーワード（重なり・包含関係にあるものも含む）を取り出す。
+    照合コストはキーワード数によらずテキスト長に比例する。
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        # 状態ごとの遷移・失敗遷移・その状態で一致するキーワード集合
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[Set[str]] = [set()]
+        self.keywords: FrozenSet[str] = frozenset(keyword for keyword in keywords if keyword)
+        for keyword in self.keywords:
+            self._add(keyword)
+        self._build_failure_links()
+
+    def _add(self, keyword: str) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(set())
+            state = next_state
+        self._outputs[state].add(keyword)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                # 失敗遷移先で一致するキーワード（接尾辞）も出力に含める
+                self._outputs[next_state] |= self._outputs[self._fail[next_state]]
+
+    def find_all(self, text: str) -> Set[str]:
+        """テキストに含まれるキーワードの集合を返す"""
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._outputs[state]:
+                found |= self._outputs[state]
+        return found
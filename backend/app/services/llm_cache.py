@@ -0,0 +1,206 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# キャッシュ設定
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+# Postgresに永続化する2段目のキャッシュ（複数インスタンス・再起動をまたいで共有）
+LLM_CACHE_DB_ENABLED = os.getenv("LLM_CACHE_DB_ENABLED", "false").lower() == "true"
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "100000"))
+# DBキャッシュの期限切れ・上限超過レコードを削除する間隔（書き込み件数）
+_DB_PURGE_INTERVAL = 100
+
+
+def normalize_prompt(prompt: str) -> str:
+    """空白や改行の揺れでキャッシュキーが変わらないようにプロンプトを正規化する"""
+    text = unicodedata.normalize("NFC", prompt)
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def make_cache_key(model_name: str, prompt: str) -> str:
+    """モデル名＋正規化したプロンプトのSHA-256をキャッシュキーにする"""
+    return hashlib.sha256(f"{model_name}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LLM応答のキャッシュ
+
+    - 1段目: プロセス内のLRUキャッシュ（件数上限・TTLで削除）
+    - 2段目: Postgresの llm_cache_entries テーブル（LLM_CACHE_DB_ENABLED=true の場合のみ）
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        db_enabled: bool = LLM_CACHE_DB_ENABLED,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_enabled = db_enabled
+        self._lock = threading.Lock()
+        # キー -> (有効期限（monotonic秒）, 応答テキスト)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._memory_hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._db_writes = 0
+
+    # ===== メモリキャッシュ =====
+
+    def get_from_memory(self, key: str) -> Optional[str]:
+        """メモリキャッシュのみを参照する（DBアクセスなし）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self._memory_hits += 1
+            return value
+
+    def _set_memory(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    # ===== DBキャッシュ =====
+
+    def _get_from_db(self, key: str) -> Optional[Tuple[str, float]]:
+        from app.db.session import SessionLocal
+        from app.db import models
+
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            entry = db.query(models.LLMCacheEntry).filter(
+                models.LLMCacheEntry.cache_key == key,
+                models.LLMCacheEntry.expires_at > now
+            ).first()
+            if entry is None:
+                return None
+            return entry.response, (entry.expires_at - now).total_seconds()
+        finally:
+            db.close()
+
+    def _set_db(self, key: str, model_name: str, value: str) -> None:
+        from sqlalchemy.dialects.postgresql import insert
+        from app.db.session import SessionLocal
+        from app.db import models
+
+        db = SessionLocal()
+        try:
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+            stmt = insert(models.LLMCacheEntry).values(
+                cache_key=key,
+                model_name=model_name,
+                response=value,
+                expires_at=expires_at
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.LLMCacheEntry.cache_key],
+                set_={"response": stmt.excluded.response, "expires_at": stmt.excluded.expires_at}
+            )
+            db.execute(stmt)
+            db.commit()
+            with self._lock:
+                self._db_writes += 1
+                should_purge = self._db_writes % _DB_PURGE_INTERVAL == 0
+            if should_purge:
+                self._purge_db(db)
+        finally:
+            db.close()
+
+    def _purge_db(self, db) -> None:
+        """期限切れのレコードと件数上限を超えた古いレコードを削除する"""
+        from app.db import models
+
+        now = datetime.now(timezone.utc)
+        db.query(models.LLMCacheEntry).filter(models.LLMCacheEntry.expires_at <= now).delete(synchronize_session=False)
+        overflow = db.query(models.LLMCacheEntry.cache_key).order_by(
+            models.LLMCacheEntry.created_at.desc()
+        ).offset(LLM_CACHE_DB_MAX_ENTRIES).subquery()
+        db.query(models.LLMCacheEntry).filter(
+            models.LLMCacheEntry.cache_key.in_(db.query(overflow.c.cache_key))
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    # ===== 公開API =====
+
+    def get(self, key: str) -> Optional[str]:
+        """メモリ→DBの順に参照し、見つからなければNoneを返す"""
+        value = self.get_from_memory(key)
+        if value is not None:
+            return value
+        if self.db_enabled:
+            try:
+                found = self._get_from_db(key)
+            except Exception as e:
+                logger.warning(f"LLMキャッシュ（DB）の参照に失敗しました: {e}")
+                found = None
+            if found is not None:
+                value, remaining_seconds = found
+                self._set_memory(key, value, ttl_seconds=remaining_seconds)
+                with self._lock:
+                    self._db_hits += 1
+                return value
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key: str, model_name: str, value: str) -> None:
+        """応答をキャッシュに保存する"""
+        self._set_memory(key, value)
+        if self.db_enabled:
+            try:
+                self._set_db(key, model_name, value)
+            except Exception as e:
+                logger.warning(f"LLMキャッシュ（DB）への保存に失敗しました: {e}")
+
+    def clear(self) -> None:
+        """メモリキャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._memory_hits + self._db_hits
+            lookups = hits + self._misses
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "db_enabled": self.db_enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": hits,
+                "memory_hits": self._memory_hits,
+                "db_hits": self._db_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+# プロセス全体で共有するキャッシュ
+llm_cache = LLMResponseCache()
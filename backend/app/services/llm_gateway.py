@@ -0,0 +1,340 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+import google.generativeai as genai
+
+from app.services.llm_cache import LLM_CACHE_ENABLED, llm_cache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# 使用するGeminiモデル名（各ルーター・サービスと共通）
+DEFAULT_GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
+# 同時に実行できるLLM呼び出しの上限
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# プロジェクトIDを持たない呼び出しが並ぶキュー
+_DEFAULT_QUEUE_KEY = "__default__"
+
+
+class _Ticket:
+    """
+    キュー内で実行枠を待つ1件の呼び出し
+
+    同期の呼び出し元は self._cond で待ち、非同期の呼び出し元は future を await して待つ
+    （イベントループ上で待つため、待っている間はスレッドを占有しない）。
+    """
+    __slots__ = ("granted", "enqueued_at", "loop", "future")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.loop = loop
+        self.future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+
+
+def _resolve(future: asyncio.Future) -> None:
+    # 待っていた側がキャンセル済みの場合は何もしない（枠の解放はキャンセルした側で行う）
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMGateway:
+    """
+    Gemini呼び出しを一元管理するゲートウェイ
+
+    - 同時実行数を max_concurrency までに制限する
+    - 待ち行列はプロジェクトごとに分け、ラウンドロビンで実行枠を割り当てる
+      （1つのプロジェクトが大量にリクエストしても他のプロジェクトが待たされ続けない）
+    - キュー長・実行中件数などの統計値を stats() で返す
+    - async def のエンドポイントからは agenerate() を使う（イベントループをブロックしない）
+      非同期の呼び出しは実行枠をイベントループ上で待ち、枠を得てからスレッドプールに渡す
+    - 同じモデル・同じプロンプトの応答はキャッシュから返す（実行枠もトークンも消費しない）
+    - astream() で応答をトークン単位で逐次受け取れる（最初のトークンまでの時間を計測）
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, model_name: str = DEFAULT_GEMINI_MODEL):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency は1以上を指定してください")
+        self.max_concurrency = max_concurrency
+        self.model_name = model_name
+        self._cond = threading.Condition()
+        # キー（プロジェクトID）ごとの待ち行列。先頭のキーから順に実行枠を割り当てる
+        self._queues: "OrderedDict[Hashable, Deque[_Ticket]]" = OrderedDict()
+        self._in_flight = 0
+        self._total_requests = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait_seconds = 0.0
+        self._total_latency_seconds = 0.0
+        self._streams = 0
+        self._total_ttft_seconds = 0.0
+        self._last_ttft_seconds: Optional[float] = None
+        # 実行枠を得た非同期呼び出しの同期SDK呼び出しだけを実行するスレッドプール
+        # （枠の待ち合わせはイベントループ側で行うため、同時実行上限と同じ数で足りる）
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="llm-gateway",
+        )
+
+    # ===== 実行枠の管理 =====
+
+    def _dispatch(self) -> None:
+        """空き枠があれば待ち行列の先頭から割り当てる（self._cond を保持した状態で呼ぶ）"""
+        granted = False
+        while self._in_flight < self.max_concurrency and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            # 割り当てたキーは末尾に回してラウンドロビンにする
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            if ticket.future is not None:
+                try:
+                    ticket.loop.call_soon_threadsafe(_resolve, ticket.future)
+                except RuntimeError:
+                    # 待っていたイベントループが閉じている場合は割り当てずに次へ進む
+                    continue
+            ticket.granted = True
+            self._in_flight += 1
+            self._total_wait_seconds += time.monotonic() - ticket.enqueued_at
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _acquire(self, key: Hashable) -> None:
+        ticket = _Ticket()
+        with self._cond:
+            self._total_requests += 1
+            self._queues.setdefault(key, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                self._cond.wait()
+
+    async def _aacquire(self, key: Hashable) -> None:
+        """_acquire() の非同期版（実行枠を得るまでイベントループ上で待つ）"""
+        ticket = _Ticket(asyncio.get_running_loop())
+        with self._cond:
+            self._total_requests += 1
+            self._queues.setdefault(key, deque()).append(ticket)
+            self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket.granted:
+                    # 割り当てと同時にキャンセルされた場合は、使わなかった枠を次の呼び出しに回す
+                    self._in_flight -= 1
+                    self._dispatch()
+                else:
+                    queue = self._queues.get(key)
+                    if queue is not None and ticket in queue:
+                        queue.remove(ticket)
+                        if not queue:
+                            del self._queues[key]
+                    self._total_requests -= 1
+            raise
+
+    def _release(self, succeeded: bool, latency: float) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if succeeded:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._total_latency_seconds += latency
+            self._dispatch()
+
+    # ===== LLM呼び出し =====
+
+    def generate(
+        self,
+        prompt: str,
+        project_id: Optional[Any] = None,
+        model_name: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> str:
+        """
+        プロンプトをGeminiに送信し、応答テキストを返す
+
+        Args:
+            prompt: 送信するプロンプト
+            project_id: 公平キューのキー（未指定の場合は共通キュー）
+            model_name: 使用するモデル名（未指定の場合はデフォルトモデル）
+            use_cache: 応答キャッシュを利用するかどうか（会話のように毎回新しい応答が欲しい場合はFalse）
+
+        Returns:
+            str: LLMの応答テキスト
+        """
+        model_name = model_name or self.model_name
+        cache_key = make_cache_key(model_name, prompt) if use_cache and LLM_CACHE_ENABLED else None
+        if cache_key is not None:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        key = project_id if project_id is not None else _DEFAULT_QUEUE_KEY
+        self._acquire(key)
+        text = self._call_granted(prompt, model_name)
+
+        if cache_key is not None and text.strip():
+            llm_cache.set(cache_key, model_name, text)
+        return text
+
+    def _call_granted(self, prompt: str, model_name: str) -> str:
+        """実行枠を得た状態でGeminiを呼び出し、終了時に枠を解放する"""
+        started_at = time.monotonic()
+        succeeded = False
+        try:
+            model = genai.GenerativeModel(model_name)
+            response = model.generate_content(prompt)
+            text = response.text
+            succeeded = True
+        finally:
+            self._release(succeeded, time.monotonic() - started_at)
+        return text
+
+    async def agenerate(
+        self,
+        prompt: str,
+        project_id: Optional[Any] = None,
+        model_name: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> str:
+        """
+        generate() の非同期版
+
+        実行枠はイベントループ上で待ち、枠を得てから Gemini SDK の同期呼び出しを専用スレッドプールで実行する。
+        そのため枠待ちの呼び出しがスレッドを占有せず、LLMの応答を待つ間もイベントループは他のリクエストを処理できる。
+        メモリキャッシュにヒットした場合はスレッドプールを経由せずに返す。
+        """
+        model_name = model_name or self.model_name
+        cache_key = make_cache_key(model_name, prompt) if use_cache and LLM_CACHE_ENABLED else None
+        loop = asyncio.get_running_loop()
+        if cache_key is not None:
+            cached = llm_cache.get_from_memory(cache_key)
+            if cached is None:
+                # DBキャッシュの参照は短時間で終わるため、LLM呼び出し用とは別の既定のスレッドプールで行う
+                cached = await loop.run_in_executor(None, llm_cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        key = project_id if project_id is not None else _DEFAULT_QUEUE_KEY
+        await self._aacquire(key)
+        # 呼び出し元がキャンセルされてもスレッド側の呼び出しが終わるまで枠は解放されない
+        text = await loop.run_in_executor(self._executor, self._call_granted, prompt, model_name)
+
+        if cache_key is not None and text.strip():
+            await loop.run_in_executor(None, llm_cache.set, cache_key, model_name, text)
+        return text
+
+    def _record_ttft(self, ttft: float) -> None:
+        with self._cond:
+            self._streams += 1
+            self._total_ttft_seconds += ttft
+            self._last_ttft_seconds = ttft
+
+    def _stream_worker(
+        self,
+        prompt: str,
+        model_name: str,
+        loop: asyncio.AbstractEventLoop,
+        queue: "asyncio.Queue",
+        cancelled: threading.Event,
+        requested_at: float,
+    ) -> None:
+        """実行枠を得た状態でストリーミング応答を受け取り、イベントループ側のキューへ渡す"""
+        started_at = time.monotonic()
+        succeeded = False
+        try:
+            model = genai.GenerativeModel(model_name)
+            response = model.generate_content(prompt, stream=True)
+            first_chunk = True
+            for chunk in response:
+                if cancelled.is_set():
+                    break
+                text = chunk.text
+                if not text:
+                    continue
+                if first_chunk:
+                    # キュー待ちも含めた、リクエストから最初のトークンまでの時間
+                    self._record_ttft(time.monotonic() - requested_at)
+                    first_chunk = False
+                loop.call_soon_threadsafe(queue.put_nowait, ("chunk", text))
+            succeeded = True
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+        finally:
+            self._release(succeeded, time.monotonic() - started_at)
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+
+    async def astream(
+        self,
+        prompt: str,
+        project_id: Optional[Any] = None,
+        model_name: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        プロンプトをGeminiに送信し、応答テキストを届いた順に返す非同期イテレータ
+
+        ストリーミング応答はキャッシュしない。呼び出し側が途中で反復をやめた場合は
+        残りの応答の受信を打ち切り、実行枠を解放する。
+        """
+        key = project_id if project_id is not None else _DEFAULT_QUEUE_KEY
+        requested_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue" = asyncio.Queue()
+        cancelled = threading.Event()
+        # 実行枠はイベントループ上で待ち、枠を得てからスレッドプールに渡す
+        await self._aacquire(key)
+        loop.run_in_executor(
+            self._executor,
+            partial(
+                self._stream_worker, prompt, model_name or self.model_name,
+                loop, queue, cancelled, requested_at,
+            ),
+        )
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+        finally:
+            cancelled.set()
+
+    # ===== 統計情報 =====
+
+    def stats(self) -> Dict[str, Any]:
+        """キュー長・実行中件数などの統計値を返す"""
+        with self._cond:
+            finished = self._completed + self._failed
+            dispatched = self._total_requests - sum(len(q) for q in self._queues.values())
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "queued_projects": len(self._queues),
+                "total_requests": self._total_requests,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_ms": round(self._total_wait_seconds / dispatched * 1000, 1) if dispatched else 0.0,
+                "avg_latency_ms": round(self._total_latency_seconds / finished * 1000, 1) if finished else 0.0,
+                "streams": self._streams,
+                "avg_ttft_ms": round(self._total_ttft_seconds / self._streams * 1000, 1) if self._streams else 0.0,
+                "last_ttft_ms": round(self._last_ttft_seconds * 1000, 1) if self._last_ttft_seconds is not None else None,
+                "cache": llm_cache.stats(),
+            }
+
+
+# プロセス全体で共有するゲートウェイ
+llm_gateway = LLMGateway()
@@ -0,0 +1,38 @@
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+# プロンプト用プロジェクト情報（相続者一覧・遺産一覧）のキャッシュ有効期間（秒）
+# 書き込み時に無効化するが、他インスタンスでの更新に備えて期限も設ける
+PROJECT_CONTEXT_TTL_SECONDS = int(os.getenv("PROJECT_CONTEXT_TTL_SECONDS", "300"))
+
+_lock = threading.Lock()
+# プロジェクトID -> (有効期限（monotonic秒）, 整形済みテキスト)
+_summaries: Dict[int, Tuple[float, str]] = {}
+
+
+def get_cached_project_summary(project_id: int) -> Optional[str]:
+    """キャッシュ済みのプロジェクト情報を返す（未キャッシュ・期限切れの場合はNone）"""
+    with _lock:
+        entry = _summaries.get(project_id)
+        if entry is None:
+            return None
+        expires_at, summary = entry
+        if expires_at <= time.monotonic():
+            del _summaries[project_id]
+            return None
+        return summary
+
+
+def set_cached_project_summary(project_id: int, summary: str) -> None:
+    with _lock:
+        _summaries[project_id] = (time.monotonic() + PROJECT_CONTEXT_TTL_SECONDS, summary)
+
+
+def invalidate_project_context(project_id: Optional[int]) -> None:
+    """相続者・遺産の追加や変更時に呼び出し、キャッシュを破棄する"""
+    if project_id is None:
+        return
+    with _lock:
+        _summaries.pop(project_id, None)
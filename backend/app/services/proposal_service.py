@@ -0,0 +1,138 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db import crud, schemas
+from app.services.llm_gateway import DEFAULT_GEMINI_MODEL, llm_gateway
+
+
+async def generate_and_save_proposals(
+    db: Session,
+    project_id: str,
+    issues: List[Dict[str, Any]],
+    estate_data: Optional[Dict[str, Any]] = None,
+    user_preferences: Optional[Dict[str, Any]] = None,
+    user_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    論点に基づいて遺産分割の提案を生成し、提案とポイントをDBに保存する
+
+    Args:
+        db: データベースセッション
+        project_id: プロジェクトID
+        issues: 論点のリスト
+        estate_data: 不動産データ
+        user_preferences: ユーザー選好
+        user_id: 提案を生成したユーザーのID
+
+    Returns:
+        Dict[str, Any]: proposals（support_rate降順・最大3件）と recommendation を含むLLMの生成結果
+
+    Raises:
+        ValueError: LLMの応答をJSONとして解釈できない場合、または必要なフィールドがない場合
+    """
+    estate_data = estate_data or {}
+    user_preferences = user_preferences or {}
+    issues_text = "\n".join([
+        f"論点{i+1}: {issue.get('title', 'タイトルなし')} - {issue.get('description', '説明なし')} "
+        f"(合意度: {issue.get('agreement_score', 0)}%)"
+        for i, issue in enumerate(issues)
+    ])
+    estate_text = "不動産データ: "
+    if estate_data:
+        estate_items = []
+        for k, v in estate_data.items():
+            estate_items.append(f"{k}: {v}")
+        estate_text += ", ".join(estate_items)
+    else:
+        estate_text += "詳細なデータなし"
+    preferences_text = "ユーザー選好: "
+    if user_preferences:
+        pref_items = []
+        for k, v in user_preferences.items():
+            pref_items.append(f"{k}: {v}")
+        preferences_text += ", ".join(pref_items)
+    else:
+        preferences_text += "詳細な選好なし"
+    prompt = f"""
+あなたは遺産相続の専門家AIアシスタントです。以下の論点と情報に基づいて、最適な遺産分割の提案を**絶対に1〜3件だけ**生成し、JSONフォーマットで結果を返してください。
+
+プロジェクトID: {project_id}
+
+論点情報:
+{issues_text}
+
+{estate_text}
+
+{preferences_text}
+
+以下の情報を含む遺産分割の提案を**必ず1〜3件だけ**生成してください。**3件を超えてはいけません。4件以上は絶対に生成しないでください。**
+1. id: 一意の識別子（例："proposal_1"）
+2. title: 提案の短いタイトル
+3. description: 提案の詳細説明
+4. points: 提案のメリット・デメリット等を示すポイントのリスト（各ポイントはtype（merit, demerit, cost, effortなど）とcontentを含む）
+5. support_rate: 想定される支持率（0〜100の整数）
+
+また、最も推奨される提案のIDも特定してください。
+
+**必ずsupport_rate（賛同率）が高い順に並べて返してください。**
+
+レスポンスは必ず以下のJSON形式で返してください（**3件まで。4件以上は絶対にNG**）：
+{{
+  "proposals": [
+    {{
+      "id": "proposal_1",
+      "title": "提案のタイトル",
+      "description": "提案の詳細説明",
+      "points": [
+        {{ "type": "merit", "content": "このプランのメリット" }},
+        {{ "type": "demerit", "content": "このプランのデメリット" }},
+        {{ "type": "cost", "content": "コストに関する考慮点" }},
+        {{ "type": "effort", "content": "必要な手続き" }}
+      ],
+      "support_rate": 支持率（0〜100の整数）
+    }}
+    // 追加する場合も最大2件まで。**絶対に3件を超えないこと！**
+  ],
+  "recommendation": "最も推奨される提案のID"
+}}
+
+遺産相続において公平性と各人の事情を考慮した提案をしてください。特に合意度が低い論点に対して有効な解決策を提示するよう心がけてください。
+説明などは不要です。JSONのみを返してください。
+"""
+    # 再生成のたびに新しい提案を作るため、提案生成はキャッシュしない
+    result_text = (await llm_gateway.agenerate(prompt, project_id=project_id, model_name=DEFAULT_GEMINI_MODEL, use_cache=False)).strip()
+    try:
+        if "```json" in result_text:
+            json_str = result_text.split("```json")[1].split("```", 1)[0].strip()
+            result = json.loads(json_str)
+        elif "```" in result_text:
+            json_str = result_text.split("```", 1)[1].split("```", 1)[0].strip()
+            result = json.loads(json_str)
+        else:
+            result = json.loads(result_text)
+    except json.JSONDecodeError as e:
+        print(f"JSONパースエラー: {e}, テキスト: {result_text}")
+        raise ValueError(f"APIレスポンスをJSONにパースできませんでした: {result_text}")
+    if "proposals" not in result or "recommendation" not in result:
+        raise ValueError("APIレスポンスに必要なフィールドがありません")
+    # support_rate降順でソートし、最大3件に制限
+    result["proposals"] = sorted(result["proposals"], key=lambda p: p.get("support_rate", 0), reverse=True)[:3]
+    # 生成された提案とポイントを1つのトランザクションでまとめてDBに保存（失敗した場合は何も保存しない）
+    crud.create_proposals_with_points(
+        db,
+        [
+            schemas.ProposalCreate(
+                project_id=int(project_id),
+                title=p["title"],
+                content=p["description"],
+                is_favorite=False,
+                support_rate=p.get("support_rate", 0.0),
+                user_id=user_id  # 提案を生成したユーザーのIDを設定
+            )
+            for p in result["proposals"]
+        ],
+        [p.get("points", []) for p in result["proposals"]]
+    )
+    return result
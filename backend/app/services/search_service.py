@@ -0,0 +1,73 @@
+import re
+import html
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.db import crud, schemas
+
+# 検索結果の抜粋の長さ（最初に一致した位置の前に SEARCH_SNIPPET_CONTEXT 文字を含める）
+SEARCH_SNIPPET_LENGTH = 120
+SEARCH_SNIPPET_CONTEXT = 30
+# 全角スペースも区切りとして扱う
+SEARCH_TERM_SPLIT_PATTERN = re.compile(r"[\s　]+")
+
+
+def parse_search_terms(q: str) -> List[str]:
+    """検索文字列を空白で区切った語のリストにする（重複は除く）"""
+    terms: List[str] = []
+    for term in SEARCH_TERM_SPLIT_PATTERN.split(q.strip()):
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def build_snippet(content: str, terms: List[str]) -> str:
+    """
+    本文から最初に一致した位置の周辺を切り出し、一致した語を <mark> で囲む
+
+    <mark> 以外はHTMLエスケープするため、そのままHTMLとして表示できる。
+    """
+    content = content or ""
+    # 長い語を優先して一致させる（「相続税」と「相続」の両方がある場合など）
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    first = pattern.search(content)
+    start = max(0, first.start() - SEARCH_SNIPPET_CONTEXT) if first else 0
+    end = min(len(content), start + SEARCH_SNIPPET_LENGTH)
+    excerpt = content[start:end]
+
+    parts = ["…"] if start > 0 else []
+    pos = 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[pos:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        pos = match.end()
+    parts.append(html.escape(excerpt[pos:]))
+    if end < len(content):
+        parts.append("…")
+    return "".join(parts)
+
+
+def search_project(
+    db: Session,
+    project_id: int,
+    user_id: int,
+    q: str,
+    sections: List[str],
+    limit: int = 20,
+) -> List[schemas.SearchHit]:
+    """プロジェクトの会話・論点・提案を全文検索し、関連度の高い順に抜粋付きで返す"""
+    terms = parse_search_terms(q)
+    if not terms:
+        return []
+    rows = crud.search_project_texts(db, project_id, user_id, terms, sections, limit)
+    return [
+        schemas.SearchHit(
+            section=row.section,
+            id=row.id,
+            snippet=build_snippet(row.content, terms),
+            rank=row.rank,
+            created_at=row.created_at,
+        )
+        for row in rows
+    ]
@@ -0,0 +1,149 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# ローカル判定の結果をそのまま返す信頼度のしきい値（これ未満はLLMで分析する）
+SENTIMENT_LOCAL_THRESHOLD = float(os.getenv("SENTIMENT_LOCAL_THRESHOLD", "0.8"))
+# ローカル判定の対象とする最大文字数（長文は文脈依存が大きいためLLMに任せる）
+SENTIMENT_LOCAL_MAX_LENGTH = int(os.getenv("SENTIMENT_LOCAL_MAX_LENGTH", "40"))
+
+# 感情キーワード（論点抽出の positive_keywords / negative_keywords と同種の語彙に感情表現を加えたもの）
+POSITIVE_WORDS = [
+    "賛成", "同意", "良い", "よい", "いい", "好き", "メリット", "賛同", "住み続け",
+    "嬉しい", "うれしい", "ありがとう", "感謝", "安心", "納得", "助かる", "助かり",
+    "素晴らしい", "楽しみ", "大賛成",
+]
+NEGATIVE_WORDS = [
+    "反対", "同意できない", "賛成できない", "納得できない", "悪い", "嫌い", "嫌だ", "いやだ",
+    "デメリット", "心配", "不安", "困る", "困って", "無理", "不満", "悲しい", "怖い",
+    "許せない", "残念", "つらい", "辛い",
+]
+# キーワード以外に含まれていると意味が反転・曖昧になる表現（含まれる場合はLLMに任せる）
+AMBIGUOUS_MARKERS = [
+    "ない", "ません", "なく", "けど", "けれど", "しかし", "でも", "ただ", "?", "？",
+]
+# キーワードと重なるため、キーワード照合前のテキストで確認する否定表現
+NEGATING_PHRASES = ["いいえ", "よくない", "良くない"]
+# 感情の判定に影響しない文末表現・記号（信頼度の計算でキーワード以外の部分から除く）
+FILLER_EXPRESSIONS = [
+    "でした", "ました", "です", "ます", "だ", "ね", "よ",
+    "。", "、", "！", "!", "…", "ー", "〜", " ", "　",
+]
+
+# 長い語を優先して照合する（「同意できない」を「同意」より先に照合する）
+_LEXICON: List[Tuple[str, str]] = sorted(
+    [(word, "positive") for word in POSITIVE_WORDS] + [(word, "negative") for word in NEGATIVE_WORDS],
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+
+
+def _match_keywords(text: str) -> Tuple[List[Tuple[str, str]], str]:
+    """
+    テキストを左から走査して最長一致でキーワードを取り出す
+
+    Returns:
+        (一致したキーワードと種類のリスト, キーワード部分を除いた残りのテキスト)
+    """
+    hits: List[Tuple[str, str]] = []
+    rest: List[str] = []
+    i = 0
+    while i < len(text):
+        for word, word_type in _LEXICON:
+            if text.startswith(word, i):
+                hits.append((word, word_type))
+                rest.append(" ")
+                i += len(word)
+                break
+        else:
+            rest.append(text[i])
+            i += 1
+    return hits, "".join(rest)
+
+
+def classify_sentiment_locally(text: str) -> Optional[Dict[str, Any]]:
+    """
+    辞書ベースで感情を判定する
+
+    短く、一方の極性のキーワードだけを含み、否定・逆接・疑問の表現を含まないテキストのみ判定する。
+
+    Returns:
+        analyze_sentiment と同じ形式の結果に confidence を加えた辞書。判定できない場合はNone
+    """
+    normalized = text.strip()
+    if not normalized or len(normalized) > SENTIMENT_LOCAL_MAX_LENGTH:
+        return None
+    if any(phrase in normalized for phrase in NEGATING_PHRASES):
+        return None
+    hits, rest = _match_keywords(normalized)
+    if not hits:
+        return None
+    if any(marker in rest for marker in AMBIGUOUS_MARKERS):
+        return None
+    types = {word_type for _, word_type in hits}
+    if len(types) != 1:
+        return None
+
+    is_positive = types == {"positive"}
+    # テキストのうちキーワードで説明できる割合（文末表現などを除く）が高いほど、キーワードが多いほど信頼度を高くする
+    # 「賛成です」は 0.9、「この案に賛成です」のようにキーワード以外の語が多い場合はしきい値未満になりLLMに任せる
+    keyword_length = sum(len(word) for word, _ in hits)
+    unexplained = rest
+    for filler in FILLER_EXPRESSIONS:
+        unexplained = unexplained.replace(filler, "")
+    coverage = keyword_length / (keyword_length + len(unexplained))
+    confidence = min(0.95, 0.5 + 0.4 * coverage + 0.05 * min(len(hits) - 1, 2))
+    keywords = []
+    for word, word_type in hits:
+        keyword = {"word": word, "type": word_type}
+        if keyword not in keywords:
+            keywords.append(keyword)
+    return {
+        "sentiment_score": 0.85 if is_positive else 0.15,
+        "is_positive": is_positive,
+        "keywords": keywords,
+        "confidence": round(confidence, 3),
+    }
+
+
+class SentimentRoutingStats:
+    """ローカル判定とLLMへのエスカレーションの件数を集計する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = 0
+        self._escalated = 0
+
+    def record(self, served_locally: bool, count: int = 1) -> None:
+        with self._lock:
+            if served_locally:
+                self._local += count
+            else:
+                self._escalated += count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._local + self._escalated
+            return {
+                "threshold": SENTIMENT_LOCAL_THRESHOLD,
+                "total": total,
+                "served_locally": self._local,
+                "escalated_to_llm": self._escalated,
+                "local_ratio": round(self._local / total, 3) if total else 0.0,
+            }
+
+
+sentiment_routing_stats = SentimentRoutingStats()
+
+
+def try_local_sentiment(text: str) -> Optional[Dict[str, Any]]:
+    """
+    信頼度がしきい値以上の場合のみローカル判定の結果を返し、件数を記録する
+    （Noneの場合は呼び出し側でLLMにエスカレーションする）
+    """
+    result = classify_sentiment_locally(text)
+    if result is not None and result["confidence"] >= SENTIMENT_LOCAL_THRESHOLD:
+        sentiment_routing_stats.record(True)
+        return {**result, "source": "local"}
+    sentiment_routing_stats.record(False)
+    return None
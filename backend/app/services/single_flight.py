@@ -0,0 +1,60 @@
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def make_flight_key(endpoint: str, project_id: Optional[Any], payload: Any) -> Tuple[str, Optional[str], str]:
+    """(エンドポイント, プロジェクトID, 入力のSHA-256) のキーを作る（入力は辞書のキー順によらず同じハッシュになる）"""
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return endpoint, None if project_id is None else str(project_id), digest
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中の場合、新たに実行せずその結果を共有する
+
+    同じプロジェクトを複数の家族が同時に開いた場合などに、同一のLLM呼び出しや
+    削除→再作成の処理が重複して走るのを防ぐ。結果（例外を含む）は実行中に
+    合流したすべての呼び出し元に返し、完了後はキーを破棄する（結果はキャッシュしない）。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+        self._executed = 0
+        self._shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        # 別のイベントループ（ジョブワーカーのスレッドなど）で実行中のタスクとは合流しない
+        if task is not None and task.get_loop() is loop:
+            self._shared += 1
+            logger.info(f"実行中の同一リクエストに合流します: {key[0] if isinstance(key, tuple) else key}")
+        else:
+            task = loop.create_task(fn())
+            self._calls[key] = task
+            self._executed += 1
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        # 呼び出し元の1つがキャンセルされても、合流している他の呼び出し元の処理は継続する
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 合流した呼び出し元がすべてキャンセルされた場合も例外を回収しておく
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "executed": self._executed, "shared": self._shared}
+
+
+# プロセス全体で共有するインスタンス
+single_flight = SingleFlight()
@@ -0,0 +1,25 @@
+"""
+ジョブワーカーを単独のプロセスとして起動する
+
+    python -m app.worker
+
+ジョブは通常このプロセスで実行する（APIサーバー内で動かすのは JOB_WORKER_IN_PROCESS=true を設定した場合のみ）。
+"""
+import logging
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+from app.services.ai_service import initialize_google_ai
+from app.services.jobs import job_worker
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    initialize_google_ai()
+    job_worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+主要な一覧取得クエリがインデックスを使っているかを EXPLAIN で確認するスクリプト
+- 検証用のデータを投入して ANALYZE する
+- crud.py の一覧取得関数を呼び出して発行された SQL の実行計画を取得し、対象テーブルが Seq Scan になっていないか確認する
+- 最後にロールバックするため、投入したデータは残らない
+
+使い方: pipenv run check-indexes（インデックスが使われていないクエリがあれば終了コード1）
+"""
+
+import sys
+import json
+import contextlib
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.db.session import engine
+from app.db import crud, models
+
+# 検証用データの目印と件数
+SEED_MARK = "index-check"
+SEED_USERS = 200
+PROJECTS_PER_USER = 5
+ROWS_PER_PROJECT = 20
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO users (email, name, hashed_password, is_active)
+    SELECT :mark || '-' || g || '@example.com', :mark, 'seed', true
+    FROM generate_series(1, :users) g
+    """,
+    """
+    INSERT INTO projects (title, user_id, status)
+    SELECT :mark, u.id, 'active'
+    FROM users u CROSS JOIN generate_series(1, :projects_per_user) g
+    WHERE u.name = :mark
+    """,
+    """
+    INSERT INTO project_members (project_id, user_id, role)
+    SELECT p.id, p.user_id, 'owner' FROM projects p WHERE p.title = :mark
+    """,
+    """
+    INSERT INTO conversations (project_id, user_id, content, speaker, created_at)
+    SELECT p.id, p.user_id, :mark, :mark, now() - g * interval '1 minute'
+    FROM projects p CROSS JOIN generate_series(1, :rows) g
+    WHERE p.title = :mark
+    """,
+    """
+    INSERT INTO issues (project_id, user_id, topic, content, type, classification)
+    SELECT p.id, p.user_id, :mark, :mark, 'neutral', 'discussing'
+    FROM projects p CROSS JOIN generate_series(1, :rows) g
+    WHERE p.title = :mark
+    """,
+    """
+    INSERT INTO proposals (project_id, user_id, title, content)
+    SELECT p.id, p.user_id, :mark, :mark
+    FROM projects p CROSS JOIN generate_series(1, :rows) g
+    WHERE p.title = :mark
+    """,
+    """
+    INSERT INTO proposal_points (proposal_id, type, content)
+    SELECT pr.id, 'merit', :mark
+    FROM proposals pr CROSS JOIN generate_series(1, 4) g
+    WHERE pr.title = :mark
+    """,
+    """
+    INSERT INTO estates (project_id, name, address)
+    SELECT p.id, :mark, :mark
+    FROM projects p CROSS JOIN generate_series(1, :rows) g
+    WHERE p.title = :mark
+    """,
+    """
+    INSERT INTO agreements (project_id, title, content, status, is_signed)
+    SELECT p.id, :mark, :mark, 'draft', false
+    FROM projects p CROSS JOIN generate_series(1, :rows) g
+    WHERE p.title = :mark
+    """,
+    """
+    INSERT INTO signatures (agreement_id, user_id, method, value)
+    SELECT a.id, p.user_id, 'text', :mark
+    FROM agreements a JOIN projects p ON p.id = a.project_id
+    WHERE a.title = :mark
+    """,
+]
+
+ANALYZE_TABLES = [
+    "users", "projects", "project_members", "conversations", "issues",
+    "proposals", "proposal_points", "estates", "agreements", "signatures",
+]
+
+
+# 一覧APIと同じく、次のページの有無を判定するため1件多く取得する
+PAGE_LIMIT = 100 + 1
+
+
+def build_queries(project_id: int, user_id: int, proposal_id: int, agreement_id: int, cursors: dict):
+    """
+    確認する crud.py の関数を（チェック対象のテーブル名とともに）返す
+
+    crud の関数をそのまま呼び出し、実際に発行された SQL の実行計画を確認する。
+    一覧取得は1ページ目と、カーソル（(created_at, id) のキーセット）を指定した2ページ目の両方を確認する。
+    """
+    return [
+        ("get_conversations_ordered_by_timestamp", "conversations",
+         lambda db: crud.get_conversations_ordered_by_timestamp(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT)),
+        ("get_conversations_ordered_by_timestamp (カーソル)", "conversations",
+         lambda db: crud.get_conversations_ordered_by_timestamp(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT, after=cursors["conversations"])),
+        ("get_conversations_ordered_by_timestamp (降順・カーソル)", "conversations",
+         lambda db: crud.get_conversations_ordered_by_timestamp(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT, after=cursors["conversations"], descending=True)),
+        ("get_issues", "issues",
+         lambda db: crud.get_issues(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT)),
+        ("get_issues (カーソル)", "issues",
+         lambda db: crud.get_issues(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT, after=cursors["issues"])),
+        ("get_proposals", "proposals",
+         lambda db: crud.get_proposals(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT)),
+        ("get_proposals (カーソル)", "proposals",
+         lambda db: crud.get_proposals(db, project_id=project_id, user_id=user_id, limit=PAGE_LIMIT, after=cursors["proposals"])),
+        ("get_proposal_points", "proposal_points",
+         lambda db: crud.get_proposal_points(db, proposal_id=proposal_id)),
+        ("get_project_members", "project_members",
+         lambda db: crud.get_project_members(db, project_id=project_id)),
+        # get_projects_for_user は OR 条件のため、作成したプロジェクト（get_projects）と参加しているプロジェクトを別々に確認する
+        ("get_projects", "projects",
+         lambda db: crud.get_projects(db, user_id=user_id, limit=PAGE_LIMIT)),
+        ("get_projects (カーソル)", "projects",
+         lambda db: crud.get_projects(db, user_id=user_id, limit=PAGE_LIMIT, after=cursors["projects"])),
+        ("get_projects_for_user (参加プロジェクト)", "project_members",
+         lambda db: db.query(models.ProjectMember.project_id).filter(models.ProjectMember.user_id == user_id).all()),
+        ("get_estates", "estates",
+         lambda db: crud.get_estates(db, project_id=project_id)),
+        ("get_agreement_by_project", "agreements",
+         lambda db: crud.get_agreement_by_project(db, project_id=project_id)),
+        ("get_signatures_by_agreement", "signatures",
+         lambda db: crud.get_signatures_by_agreement(db, agreement_id=agreement_id)),
+    ]
+
+
+@contextlib.contextmanager
+def capture_statements(con):
+    """接続で発行された SQL とパラメータを記録する"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(con, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(con, "before_cursor_execute", before_cursor_execute)
+
+
+def find_seq_scans(plan: dict, table: str) -> list:
+    """実行計画のノードから、指定したテーブルの Seq Scan を探す"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == table:
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child, table))
+    return found
+
+
+def check_indexes() -> bool:
+    """検証用データを投入して実行計画を確認する（成功すればTrue）"""
+    ok = True
+    with contextlib.closing(engine.connect()) as con:
+        trans = con.begin()
+        try:
+            print("検証用データを投入中...")
+            params = {
+                "mark": SEED_MARK,
+                "users": SEED_USERS,
+                "projects_per_user": PROJECTS_PER_USER,
+                "rows": ROWS_PER_PROJECT,
+            }
+            for statement in SEED_STATEMENTS:
+                con.execute(text(statement), params)
+            for table in ANALYZE_TABLES:
+                con.execute(text(f"ANALYZE {table}"))
+
+            project_id, user_id = con.execute(
+                text("SELECT id, user_id FROM projects WHERE title = :mark ORDER BY id LIMIT 1"), params
+            ).one()
+            proposal_id = con.execute(
+                text("SELECT id FROM proposals WHERE project_id = :project_id ORDER BY id LIMIT 1"),
+                {"project_id": project_id}
+            ).scalar_one()
+            agreement_id = con.execute(
+                text("SELECT id FROM agreements WHERE project_id = :project_id ORDER BY id LIMIT 1"),
+                {"project_id": project_id}
+            ).scalar_one()
+            # 2ページ目の確認に使うカーソル（各テーブルの並び順で中ほどの行）
+            cursors = {}
+            for table in ["conversations", "issues", "proposals", "projects"]:
+                cursors[table] = tuple(con.execute(
+                    text(f"SELECT created_at, id FROM {table} WHERE user_id = :user_id ORDER BY created_at, id OFFSET :offset LIMIT 1"),
+                    {"user_id": user_id, "offset": ROWS_PER_PROJECT // 2 if table != "projects" else 1}
+                ).one())
+
+            with Session(bind=con) as db:
+                for name, table, call in build_queries(project_id, user_id, proposal_id, agreement_id, cursors):
+                    with capture_statements(con) as statements:
+                        call(db)
+                    for statement, parameters in statements:
+                        plan = con.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar_one()
+                        if isinstance(plan, str):
+                            plan = json.loads(plan)
+                        if find_seq_scans(plan[0]["Plan"], table):
+                            ok = False
+                            print(f"NG: {name} - {table} が Seq Scan になっています")
+                            print(statement)
+                            print(json.dumps(plan, indent=2, ensure_ascii=False))
+                            break
+                    else:
+                        print(f"OK: {name}")
+        finally:
+            # 投入した検証用データは残さない
+            trans.rollback()
+    return ok
+
+
+if __name__ == "__main__":
+    if check_indexes():
+        print("すべてのクエリでインデックスが使われています。")
+    else:
+        print("インデックスが使われていないクエリがあります。")
+        sys.exit(1)
@@ -0,0 +1,48 @@
+"""add indexes for list queries
+
+Revision ID: 0a7c3e5b9d21
+Revises: f2b8d6a4c913
+Create Date: 2026-10-17 16:21:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7c3e5b9d21'
+down_revision: Union[str, None] = 'f2b8d6a4c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (インデックス名, テーブル名, カラム)
+INDEXES = [
+    ('ix_conversations_project_id_user_id_created_at', 'conversations', ['project_id', 'user_id', 'created_at']),
+    ('ix_issues_project_id_user_id', 'issues', ['project_id', 'user_id']),
+    ('ix_proposals_project_id_user_id', 'proposals', ['project_id', 'user_id']),
+    ('ix_proposal_points_proposal_id', 'proposal_points', ['proposal_id']),
+    ('ix_project_members_project_id', 'project_members', ['project_id']),
+    ('ix_project_members_user_id', 'project_members', ['user_id']),
+    ('ix_projects_user_id', 'projects', ['user_id']),
+    ('ix_estates_project_id', 'estates', ['project_id']),
+    ('ix_signatures_agreement_id', 'signatures', ['agreement_id']),
+    ('ix_agreements_project_id', 'agreements', ['project_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 本番環境でテーブルをロックしないよう CONCURRENTLY で作成する（トランザクション外で実行する必要がある）
+    # 途中で失敗した場合は INVALID なインデックスが残るため、downgrade してからやり直す
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(sa.text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
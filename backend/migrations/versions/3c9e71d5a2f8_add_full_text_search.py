@@ -0,0 +1,64 @@
+"""add full text search
+
+Revision ID: 3c9e71d5a2f8
+Revises: 0a7c3e5b9d21
+Create Date: 2026-10-17 18:02:51.336917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.db import search_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e71d5a2f8'
+down_revision: Union[str, None] = '0a7c3e5b9d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 既存の行の search_vector を計算する際、1回のトランザクションで更新する行数（idの範囲）
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 関数の定義には正規表現の [:space:] などが含まれるため、バインド変数として解釈されないよう DDL として実行する
+    for statement in search_ddl.NGRAM_SEARCH_FUNCTIONS:
+        op.execute(sa.DDL(statement))
+    # NULL可の列の追加はメタデータの変更だけで済む（生成列と違いテーブルの書き換えが発生しない）
+    # 追加・更新される行はトリガーで計算する
+    for table in search_ddl.SEARCH_TABLES:
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(sa.text(search_ddl.search_vector_trigger(table)))
+    with op.get_context().autocommit_block():
+        # 既存の行は id の範囲ごとにコミットしながら計算する（ロックは更新中の行だけにとどめる）
+        bind = op.get_bind()
+        for table in search_ddl.SEARCH_TABLES:
+            max_id = bind.execute(sa.text(f'SELECT max(id) FROM {table}')).scalar() or 0
+            for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+                bind.execute(
+                    sa.text(search_ddl.search_vector_backfill(table)),
+                    {'start': start, 'end': start + BACKFILL_BATCH_SIZE}
+                )
+        # GINインデックスはテーブルをロックしないよう CONCURRENTLY で作成する
+        for table in search_ddl.SEARCH_TABLES:
+            op.create_index(
+                f'ix_{table}_search_vector', table, ['search_vector'],
+                unique=False, postgresql_using='gin', postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in reversed(search_ddl.SEARCH_TABLES):
+            op.execute(sa.text(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_search_vector'))
+    for table in reversed(search_ddl.SEARCH_TABLES):
+        op.execute(sa.text(search_ddl.drop_search_vector_trigger(table)))
+        op.drop_column(table, 'search_vector')
+    for statement in search_ddl.DROP_NGRAM_SEARCH_FUNCTIONS:
+        op.execute(sa.text(statement))
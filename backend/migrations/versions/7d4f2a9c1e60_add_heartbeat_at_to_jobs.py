@@ -0,0 +1,28 @@
+"""add heartbeat_at to jobs
+
+Revision ID: 7d4f2a9c1e60
+Revises: 3c9e71d5a2f8
+Create Date: 2026-10-17 21:14:06.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d4f2a9c1e60'
+down_revision: Union[str, None] = '3c9e71d5a2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('jobs', 'heartbeat_at')
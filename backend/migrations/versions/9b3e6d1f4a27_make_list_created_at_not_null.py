@@ -0,0 +1,42 @@
+"""make created_at not null on paginated tables
+
+Revision ID: 9b3e6d1f4a27
+Revises: 7d4f2a9c1e60
+Create Date: 2026-10-17 22:03:41.207815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e6d1f4a27'
+down_revision: Union[str, None] = '7d4f2a9c1e60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# カーソルページング（(created_at, id) の順）で一覧を取得するテーブル
+PAGINATED_TABLES = ['users', 'projects', 'conversations', 'proposals', 'issues']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in PAGINATED_TABLES:
+        # created_at が NULL の行はカーソルを作れないため、現在時刻で埋める
+        op.execute(sa.text(f'UPDATE {table} SET created_at = now() WHERE created_at IS NULL'))
+        # 先に検証済みの CHECK 制約を作っておくと、SET NOT NULL でテーブル全体の走査（ロック中）を省ける
+        op.execute(sa.text(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_created_at_not_null '
+            f'CHECK (created_at IS NOT NULL) NOT VALID'
+        ))
+        op.execute(sa.text(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_created_at_not_null'))
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+        op.drop_constraint(f'{table}_created_at_not_null', table, type_='check')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(PAGINATED_TABLES):
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True)